@@ -0,0 +1,53 @@
+import numpy as np
+
+class ArcLengthTable():
+    def __init__(self, points: np.ndarray, spacing: float, tangents: np.ndarray = None) -> None:
+        '''A polyline sampled every spacing pixels of path distance. points[i] is where a droplet is after travelling i * spacing pixels
+        along the path, so looking up a distance is an index calculation instead of evaluating a polynomial.
+        tangents are the unit directions at every point if they've already been worked out (a compiled course), otherwise they're computed'''
+        self.points = points
+        self.spacing = spacing
+        self.length = spacing * (len(points) - 1)
+        if tangents is None:
+            tangents = np.gradient(points, axis=0)
+            norms = np.linalg.norm(tangents, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            tangents = tangents / norms
+        self.tangents = tangents
+
+    def interpolate(self, table: np.ndarray, distances) -> np.ndarray:
+        '''O(1) lookup of table rows at any distance along the path, linear between the two closest samples. Distances are clamped to the path'''
+        distances = np.clip(np.asarray(distances, dtype=float), 0, self.length)
+        position = distances / self.spacing
+        index = np.minimum(position.astype(np.int64), len(table) - 2)
+        fraction = (position - index)[..., None]
+        return table[index] * (1 - fraction) + table[index + 1] * fraction
+
+    def points_at(self, distances) -> np.ndarray:
+        '''Returns an (N, 2) array of the (x, y) points after travelling each distance along the path'''
+        return self.interpolate(self.points, distances)
+
+    def tangents_at(self, distances) -> np.ndarray:
+        '''Unit direction of travel at each distance'''
+        tangents = self.interpolate(self.tangents, distances)
+        norms = np.linalg.norm(tangents, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return tangents / norms
+
+def build_arc_length_table(start: (int, int), mid: (int, int), end: (int, int), spacing: float = 0.5, oversample: int = 1024) -> ArcLengthTable:
+    '''
+    Builds the arc length table of a curve through its start, middle and end points. Instead of fitting y = f(x), which breaks down on
+    near vertical arms where a small step in x is a huge jump in y, the curve is the parametric quadratic P(u) that passes through
+    the start at u = 0, the middle at u = 0.5 and the end at u = 1. It is sampled densely, the distance travelled is accumulated and then
+    resampled every spacing pixels of path. Only done once when the course is built.
+    '''
+    s, m, e = (np.asarray(point, dtype=float) for point in (start, mid, end))
+    u = np.linspace(0, 1, oversample)[:, None]
+    dense = s * (2 * u - 1) * (u - 1) - m * 4 * u * (u - 1) + e * u * (2 * u - 1)
+
+    travelled = np.concatenate(([0], np.cumsum(np.linalg.norm(np.diff(dense, axis=0), axis=1))))
+    samples = max(int(np.ceil(travelled[-1] / spacing)) + 1, 2)
+    spacing = travelled[-1] / (samples - 1) if travelled[-1] else spacing
+    distances = np.arange(samples) * spacing
+    points = np.column_stack((np.interp(distances, travelled, dense[:, 0]), np.interp(distances, travelled, dense[:, 1])))
+    return ArcLengthTable(points, spacing)
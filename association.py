@@ -0,0 +1,43 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+GATED = 1e9
+
+def build_cost_matrix(detection_points, detection_segments, droplet_points, droplet_sections, max_distance: float) -> np.ndarray:
+    '''
+    Builds the detections x droplets cost matrix in one numpy call. The cost is the distance between a detection midpoint and a droplet.
+    A pair is gated out (cost GATED) when the detection is further than max_distance from the droplet, or when the detection isn't in the droplet's
+    section or the one after it. That second rule is the same as only considering the droplets in a segment's queue since every droplet sits in
+    the queue of its current section and the next one.
+    '''
+    detection_points = np.asarray(detection_points, dtype=float).reshape(-1, 2)
+    droplet_points = np.asarray(droplet_points, dtype=float).reshape(-1, 2)
+    detection_segments = np.asarray(detection_segments).reshape(-1, 1)
+    droplet_sections = np.asarray(droplet_sections).reshape(1, -1)
+
+    difference = detection_points[:, None, :] - droplet_points[None, :, :]
+    cost = np.hypot(difference[..., 0], difference[..., 1])
+    in_segment = (detection_segments == droplet_sections) | (detection_segments == droplet_sections + 1)
+    cost[~in_segment | (cost > max_distance)] = GATED
+    return cost
+
+def associate(detection_points, detection_segments, droplet_points, droplet_sections, max_distance: float) -> ([(int, int)], [int], [int]):
+    '''
+    Matches detections to droplets with one Hungarian (linear sum assignment) solve per frame instead of a greedy closest droplet per detection,
+    so two detections can never claim the same droplet. Detections with a negative segment (off the course) are never matched.
+    Returns the matched (detection index, droplet index) pairs, the unmatched detection indices and the unmatched droplet indices.
+    '''
+    number_of_detections, number_of_droplets = len(detection_points), len(droplet_points)
+    if not number_of_detections or not number_of_droplets:
+        return [], list(range(number_of_detections)), list(range(number_of_droplets))
+
+    cost = build_cost_matrix(detection_points, detection_segments, droplet_points, droplet_sections, max_distance)
+    rows, cols = linear_sum_assignment(cost)
+    valid = cost[rows, cols] < GATED
+    matches = list(zip(rows[valid].tolist(), cols[valid].tolist()))
+
+    matched_detections = set(rows[valid].tolist())
+    matched_droplets = set(cols[valid].tolist())
+    unmatched_detections = [i for i in range(number_of_detections) if i not in matched_detections]
+    unmatched_droplets = [j for j in range(number_of_droplets) if j not in matched_droplets]
+    return matches, unmatched_detections, unmatched_droplets
@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from detection_stage import load_backend
+from droplet_tracker import COURSE_MODULES, course_main
+from onnx_backend import export_onnx
+
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov", ".avi", ".mkv")
+
+backend = None
+
+def find_videos(source: str) -> list:
+    '''Every video in a directory, or every file matching a glob like droplet_videos/*_raw.mp4'''
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if path.lower().endswith(VIDEO_EXTENSIONS))
+
+def output_paths(output_dir: str, video_path: str) -> (str, str):
+    '''The tracks file and summary file a video's job writes'''
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(output_dir, f"{name}.tracks.csv"), os.path.join(output_dir, f"{name}.summary.json")
+
+def load_worker(runtime: str, weights_path: str, threads: int) -> None:
+    '''Loads the model the first time a worker process runs a job so it's loaded once per worker instead of once per video'''
+    global backend
+    if runtime == "torch" and threads:
+        import torch
+        torch.set_num_threads(threads)
+    backend = load_backend(runtime, weights_path, threads)
+
+def run_job(job: (str, str, str, str, str, str, str, str, int)) -> dict:
+    '''Tracks one video headless and writes its summary last, so a summary on disk means the job finished. If the model can't be loaded
+    the job comes back with the error like any other failed job, instead of the worker dying and the pool starting it again forever.
+    model_path is what's loaded, the weights or their ONNX export, weights_path is still what the detection cache is keyed by.
+    course_module is the course script (DropShop or dropshop_IP) whose main tracks the video'''
+    video_path, weights_path, model_path, course_path, course_module, cache_dir, output_dir, runtime, threads = job
+    tracks_path, summary_path = output_paths(output_dir, video_path)
+    start_time = time.perf_counter()
+    try:
+        if backend is None:
+            load_worker(runtime, model_path, threads)
+        summary = course_main(course_module)(weights_path, video_path, cache_dir=cache_dir, headless=True, tracks_path=tracks_path,
+                                             course_path=course_path, runtime=runtime, backend=backend)
+    except Exception as e:
+        return {"video": video_path, "error": repr(e)}
+    if summary is None:
+        return {"video": video_path, "error": "Video file could not be opened"}
+    summary["seconds"] = time.perf_counter() - start_time
+    summary["fps"] = summary["frames"] / summary["seconds"] if summary["seconds"] else 0.0
+    summary["tracks"] = tracks_path
+    temporary = summary_path + ".tmp"
+    with open(temporary, 'w') as file:
+        json.dump(summary, file, indent=2)
+    os.replace(temporary, summary_path)
+    return summary
+
+def main(source: str, weights_path: str, course_path: str = None, output_dir: str = "batch_output", cache_dir: str = "detection_cache",
+         processes: int = None, runtime: str = "torch", threads: int = 1, course_module: str = "DropShop") -> None:
+    '''
+    Tracks every video in source across a pool of processes, one per core unless processes says otherwise. Each worker loads the model once
+    and takes videos off the queue until there are none left. The onnx runtime exports the weights once here before the pool starts,
+    the workers load the exported model. Videos that already have a summary in output_dir are skipped, so running the
+    same command again after an interruption picks up where it stopped. threads is the CPU threads each worker's inference can use, keep
+    processes * threads at about the number of cores. course_module is the course script whose course, schedule and dispensers are used.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    videos = find_videos(source)
+    pending = [video for video in videos if not os.path.exists(output_paths(output_dir, video)[1])]
+    print(f"{len(videos)} videos, {len(videos) - len(pending)} already done, {len(pending)} to run")
+    if not pending:
+        return
+
+    model_path = export_onnx(weights_path) if runtime == "onnx" else weights_path
+    jobs = [(video, weights_path, model_path, course_path, course_module, cache_dir, output_dir, runtime, threads) for video in pending]
+
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        for done, summary in enumerate(pool.imap_unordered(run_job, jobs), start=1):
+            if "error" in summary:
+                print(f"[{done}/{len(jobs)}] {summary['video']} failed: {summary['error']}")
+            else:
+                print(f"[{done}/{len(jobs)}] {summary['video']} {summary['frames']} frames, {summary['droplets']} droplets, {summary['fps']:.1f} fps")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Track droplets in many videos in parallel")
+    parser.add_argument("videos", help="Directory of videos or a glob like 'droplet_videos/*_raw.mp4'")
+    parser.add_argument("--weights", default="runs/detect/train10/weights/best.pt", help="YOLO weights file")
+    parser.add_argument("--course", help="Course file saved by the bounding box interface, the hard coded course is used without one")
+    parser.add_argument("--course-module", choices=COURSE_MODULES, default="DropShop", help="Course script whose course, schedule and dispensers are used")
+    parser.add_argument("--output", default="batch_output", help="Where the tracks and summary of every video are written")
+    parser.add_argument("--cache-dir", default="detection_cache", help="Where detections are cached, an empty string always runs the model")
+    parser.add_argument("--processes", type=int, help="Worker processes, one per core by default")
+    parser.add_argument("--runtime", choices=("torch", "onnx"), default="torch", help="Run YOLO with PyTorch or with ONNX Runtime on the CPU")
+    parser.add_argument("--threads", type=int, default=1, help="CPU threads each worker's inference can use")
+    args = parser.parse_args()
+    main(args.videos, args.weights, args.course, args.output, args.cache_dir or None, args.processes, args.runtime, args.threads,
+         args.course_module)
@@ -0,0 +1,66 @@
+import argparse
+import os
+import re
+import time
+import cv2
+from DropShop import build_course
+from droplet_tracker import load_model
+from course_lookup import build_course_lookup
+from blob_detector import BlobDetector
+from onnx_backend import OnnxBackend, export_onnx
+
+def load_frames(folder: str) -> list:
+    '''Reads every frameN.png in folder in frame order. Sorted by the number since frame10 comes before frame2 alphabetically'''
+    names = [name for name in os.listdir(folder) if re.fullmatch(r"frame\d+\.png", name)]
+    names.sort(key=lambda name: int(name[5:-4]))
+    return [cv2.imread(os.path.join(folder, name)) for name in names]
+
+def timed(load):
+    '''Returns what load returns and how many seconds it took'''
+    start_time = time.perf_counter()
+    loaded = load()
+    return loaded, time.perf_counter() - start_time
+
+def time_detector(detect, frames: list) -> (float, int):
+    '''Runs detect on every frame in order, returns the milliseconds per frame and how many detections there were in total'''
+    detections = 0
+    start_time = time.perf_counter()
+    for frame in frames:
+        detections += len(detect(frame))
+    return (time.perf_counter() - start_time) * 1000 / len(frames), detections
+
+def main(folders: list, weights_path: str, threads: int = None) -> None:
+    '''
+    Compares the BlobDetector with YOLO on PyTorch and on ONNX Runtime on folders of extracted frames. Startup is how long it takes to get
+    the detector ready including imports (the ONNX export is done once before timing, it's cached after that). YOLO is skipped if the weights
+    file isn't there.
+    '''
+    detectors = []
+    if os.path.exists(weights_path):
+        model, startup = timed(lambda: load_model(weights_path))
+        detectors.append(("torch", startup, lambda frame: model.predict(frame, verbose=False)[0].boxes.data))
+        onnx_path = export_onnx(weights_path)
+        backend, startup = timed(lambda: OnnxBackend(onnx_path, threads))
+        detectors.append(("onnx", startup, lambda frame: backend.detect([frame])[0]))
+
+    course = build_course()
+    print(f"{'frames':<28}{'detector':<10}{'startup s':>10}{'ms/frame':>10}{'fps':>10}{'detections':>12}")
+    for folder in folders:
+        frames = load_frames(folder)
+        if not frames:
+            print("No frames in", folder)
+            continue
+        height, width = frames[0].shape[:2]
+        blob, startup = timed(lambda: BlobDetector(build_course_lookup(course, (width, height)).mask()))
+        for name, startup, detect in [("blob", startup, blob.detect_frame)] + detectors:
+            detect(frames[0]) # the first call sets everything up, it shouldn't count
+            latency, detections = time_detector(detect, frames)
+            print(f"{folder:<28}{name:<10}{startup:>10.2f}{latency:>10.1f}{1000 / latency:>10.1f}{detections:>12}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the blob detector with YOLO on PyTorch and ONNX Runtime on extracted frames")
+    parser.add_argument("folders", nargs="*", default=["folder/video1_frames", "folder/video3_frames"], help="Folders of frameN.png files")
+    parser.add_argument("--weights", default="runs/detect/train10/weights/best.pt", help="YOLO weights file")
+    parser.add_argument("--threads", type=int, help="CPU threads one ONNX Runtime inference can use")
+    args = parser.parse_args()
+    main(args.folders, args.weights, args.threads)
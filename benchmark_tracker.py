@@ -0,0 +1,223 @@
+import argparse
+import json
+import math
+import platform
+import subprocess
+import time
+import numpy as np
+from droplet_tracker import Path, Straight, Curve, Droplet, register_droplets, sync_droplets
+from course_lookup import build_course_lookup, OFF_COURSE
+from centerline import build_centerline
+from kalman_tracker import KalmanTracker
+from association import associate
+from profiler import Profiler
+
+STAGES = ("predict", "segment_lookup", "associate", "closest", "update", "frame")
+
+def turn(start: (int, int), corner: (int, int), end: (int, int), half_width: int) -> Curve:
+    '''A quarter turn from start to end, corner is where the straight lines going in and coming out of the turn would meet.
+    The middle point is put on the circle through start and end so the turn is round instead of pointy'''
+    center = np.add(start, end) - np.asarray(corner)
+    mid = center + (np.asarray(corner) - center) / np.sqrt(2)
+    xs, ys = (start[0], end[0]), (start[1], end[1])
+    direction = (int(np.sign(end[0] - start[0])), int(np.sign(end[1] - start[1])))
+    curve = Curve((min(xs) - half_width, min(ys) - half_width), (max(xs) + half_width, max(ys) + half_width), direction)
+    curve.add_sme(start, (float(mid[0]), float(mid[1])), end)
+    return curve
+
+def find_closest_droplet(drops_to_consider: list, mid: (int, int)):
+    '''The greedy nearest droplet search the tracker used before associate, only kept here so the benchmark can compare against it'''
+    closest = float('inf')
+    closest_drop = None
+    for drop in drops_to_consider:
+        distance = math.hypot(drop.x - mid[0], drop.y - mid[1])
+        if distance < closest:
+            closest_drop = drop
+            closest = distance
+    return closest_drop
+
+def build_synthetic_course(rows: int, length: int = 600, radius: int = 20, gap: int = 20, width: int = 20) -> Path:
+    '''
+    Builds a serpentine course out of the same Straight and Curve objects as the real one. rows horizontal straights length pixels long
+    going right then left then right..., each joined to the next by a turn down, a straight gap pixels long and a turn back across.
+    Every extra row adds 4 segments. width is how wide the straights' boxes are.
+    '''
+    half_width = width // 2
+    left = radius + width
+    right = left + length
+    y = radius + width
+    course = Path()
+    for row in range(rows):
+        going_right = row % 2 == 0
+        course.add_segment(Straight((left, y - half_width), (right, y + half_width), (1 if going_right else -1, 0)))
+        if row == rows - 1:
+            break
+        x_out = right if going_right else left
+        x_turn = x_out + (radius if going_right else -radius)
+        y_next = y + 2 * radius + gap
+        course.add_segment(turn((x_out, y), (x_turn, y), (x_turn, y + radius), half_width))
+        course.add_segment(Straight((x_turn - half_width, y + radius), (x_turn + half_width, y + radius + gap), (0, 1)))
+        course.add_segment(turn((x_turn, y + radius + gap), (x_turn, y_next), (x_out, y_next), half_width))
+        y = y_next
+    return course
+
+def simulate(centerline, course_lookup, droplets: int, frames: int, rng, max_speed: float = 3.0, noise: float = 1.5,
+             dropout: float = 0.1, false_positives: float = 2.0) -> (np.ndarray, np.ndarray, list):
+    '''
+    Moves droplets along the centerline at constant speeds and makes every frame's detections from them. Each detection is the droplet's
+    true position plus noise pixels of gaussian noise, a droplet isn't detected at all on a dropout fraction of frames and on average
+    false_positives detections a frame land anywhere on (or off) the course. The droplets start spread over the course, far enough from
+    the end that none of them finishes it before the last frame.
+    Returns the starting path positions, the speeds and for every frame the (N, 2) integer midpoints and the true id of each one (-1 when false).
+    '''
+    starts = rng.uniform(0, max(centerline.length - max_speed * frames, 0), droplets)
+    speeds = rng.uniform(0.5, max_speed, droplets)
+    ids = np.arange(1, droplets + 1)
+    detections = []
+    for t in range(1, frames + 1):
+        seen = rng.random(droplets) >= dropout
+        points = centerline.to_pixels(starts[seen] + speeds[seen] * t) + rng.normal(0, noise, (int(seen.sum()), 2))
+        false_points = rng.uniform((0, 0), (course_lookup.width, course_lookup.height), (rng.poisson(false_positives), 2))
+        mids = np.vstack((points, false_points)).astype(np.int64)
+        true_ids = np.concatenate((ids[seen], np.full(len(false_points), -1)))
+        order = rng.permutation(len(mids))
+        detections.append((mids[order], true_ids[order]))
+    return starts, speeds, detections
+
+def run_scenario(droplets: int, rows: int, length: int, frames: int, seed: int = 0, max_speed: float = 3.0, noise: float = 1.5,
+                 dropout: float = 0.1, false_positives: float = 2.0, max_jump_distance: float = 40) -> dict:
+    '''
+    Tracks that many simulated droplets on a fresh synthetic course with the same steps as droplet_tracker.main, without any video or detector, and
+    times every step. predict is the motion model's prediction and syncing the droplets, segment_lookup is finding the segment of every
+    detection, associate is the Hungarian matching, update is projecting the matched detections on to the centerline and correcting the motion
+    model. closest is the old greedy nearest droplet search over each segment's droplets for comparison (its result isn't used), it runs after
+    the frame has ended so frame and fps only measure what droplet_tracker.main does. Building the course lookup and centerline is timed once as setup.
+    '''
+    rng = np.random.default_rng(seed)
+    setup = Profiler(True)
+    with setup.stage("course"):
+        course = build_synthetic_course(rows, length)
+    with setup.stage("course_lookup"):
+        course_lookup = build_course_lookup(course)
+    with setup.stage("centerline"):
+        centerline = build_centerline(course)
+    starts, speeds, detections = simulate(centerline, course_lookup, droplets, frames, rng, max_speed, noise, dropout, false_positives)
+
+    all_droplets = course.droplets
+    motion = KalmanTracker(dim=1, max_speed=max_speed + 2)
+    points = centerline.to_pixels(starts)
+    sections = centerline.segment_of(starts)
+    for droplet_id, ((x, y), section, speed) in enumerate(zip(points.tolist(), sections.tolist(), speeds.tolist()), start=1):
+        drop = Droplet(droplet_id, x, y, speed, section)
+        course.add_droplet_to_queues(drop)
+    with setup.stage("register"):
+        register_droplets(all_droplets, motion, centerline)
+
+    profiler = Profiler(True)
+    real_detections = matched = correct = 0
+    for mids, true_ids in detections:
+        profiler.start_frame()
+        motion.predict()
+        sync_droplets(motion, centerline, course)
+        profiler.lap("predict")
+
+        segment_indices = course_lookup.segment_indices(mids)
+        profiler.lap("segment_lookup")
+
+        slots = all_droplets.active_slots()
+        drops = all_droplets.views[slots]
+        matches, _, _ = associate(mids, segment_indices, all_droplets.points(slots), all_droplets.section[slots], max_jump_distance)
+        profiler.lap("associate")
+
+        observed_detections = [detection for detection, _ in matches]
+        distances, lateral_offsets = centerline.project(mids[observed_detections], segment_indices[observed_detections])
+        motion.update([drops[drop].id for _, drop in matches], distances)
+        for (_, drop), lateral_offset in zip(matches, lateral_offsets.tolist()):
+            drops[drop].lateral_offset = lateral_offset
+        sync_droplets(motion, centerline, course)
+        profiler.lap("update")
+        profiler.end_frame()
+
+        with profiler.stage("closest"):
+            for mid, segment in zip(mids.tolist(), segment_indices.tolist()):
+                if segment != OFF_COURSE:
+                    find_closest_droplet(course.droplets_near(segment), mid)
+
+        real_detections += int((true_ids >= 0).sum())
+        matched += sum(1 for detection, _ in matches if true_ids[detection] >= 0)
+        correct += sum(1 for detection, drop in matches if true_ids[detection] == drops[drop].id)
+
+    stages = profiler.summary()
+    frame_seconds = stages["frame"]["mean"] * stages["frame"]["count"] / 1000
+    return {"droplets": droplets, "segments": len(course.segments_in_order), "course_length": float(centerline.length), "frames": frames,
+            "setup": {name: stage["mean"] for name, stage in setup.summary().items()}, "stages": stages,
+            "fps": frames / frame_seconds if frame_seconds else 0.0,
+            "matched": matched / real_detections if real_detections else 0.0, "correct": correct / matched if matched else 0.0}
+
+def git_commit() -> str:
+    '''The commit being benchmarked so results from different commits can be told apart, None outside of a git checkout'''
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list, baseline_path: str) -> None:
+    '''Prints how every stage's p50 changed since a results file saved by an earlier run, over 1.1x slower is flagged'''
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)
+    old = {result["droplets"]: result["stages"] for result in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}")
+    for result in results:
+        for name in STAGES:
+            if result["droplets"] not in old or name not in old[result["droplets"]]:
+                continue
+            before, after = old[result["droplets"]][name]["p50"], result["stages"][name]["p50"]
+            ratio = after / before if before else float('inf')
+            print(f"{result['droplets']:>8} {name:<16}{before:>10.3f}{after:>10.3f}{ratio:>8.2f}x{'  slower' if ratio > 1.1 else ''}")
+
+def main(droplet_counts: list = (10, 100, 1000), rows: int = 8, length: int = 600, frames: int = 200, seed: int = 0,
+         noise: float = 1.5, dropout: float = 0.1, false_positives: float = 2.0, output_path: str = "benchmark_tracker.json",
+         baseline_path: str = None) -> dict:
+    '''
+    Times the tracker on its own, no video, detector or drawing, at every number of droplets in droplet_counts on the same synthetic course.
+    The droplets get closer together as there are more of them, raise rows to keep them apart. Every run uses the same seed so the
+    simulated detections are identical between commits. The results are saved to output_path as JSON with the commit they came from,
+    baseline_path is an earlier results file to compare the p50 of every stage against.
+    '''
+    results = []
+    print(f"{'droplets':>8} {'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for droplets in droplet_counts:
+        result = run_scenario(droplets, rows, length, frames, seed, noise=noise, dropout=dropout, false_positives=false_positives)
+        results.append(result)
+        for name in STAGES:
+            stage = result["stages"][name]
+            print(f"{droplets:>8} {name:<16}{stage['p50']:>10.3f}{stage['p95']:>10.3f}{stage['p99']:>10.3f}")
+        print(f"{droplets:>8} {result['segments']} segments, {result['fps']:.0f} fps, {result['matched']:.1%} of detections matched, "
+              f"{result['correct']:.1%} of matches to the right droplet")
+
+    report = {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "numpy": np.__version__, "machine": platform.machine(),
+              "settings": {"rows": rows, "length": length, "frames": frames, "seed": seed, "noise": noise, "dropout": dropout,
+                           "false_positives": false_positives},
+              "results": results}
+    if output_path:
+        with open(output_path, 'w') as file:
+            json.dump(report, file, indent=2)
+    if baseline_path:
+        compare(results, baseline_path)
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the tracker on synthetic courses with simulated detections")
+    parser.add_argument("--droplets", type=int, nargs="+", default=[10, 100, 1000], help="Numbers of droplets on the course at once to time")
+    parser.add_argument("--rows", type=int, default=8, help="Rows of the serpentine course, every row adds 4 segments")
+    parser.add_argument("--length", type=int, default=600, help="Length of every row in pixels")
+    parser.add_argument("--frames", type=int, default=200, help="Frames to track for every number of droplets")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the simulated droplets and detections")
+    parser.add_argument("--noise", type=float, default=1.5, help="Standard deviation of the detection noise in pixels")
+    parser.add_argument("--dropout", type=float, default=0.1, help="Fraction of frames a droplet isn't detected on")
+    parser.add_argument("--false-positives", type=float, default=2.0, help="Average number of false detections a frame")
+    parser.add_argument("--output", default="benchmark_tracker.json", help="Where the results are saved")
+    parser.add_argument("--baseline", help="Results file from an earlier commit to compare against")
+    args = parser.parse_args()
+    main(args.droplets, args.rows, args.length, args.frames, args.seed, args.noise, args.dropout, args.false_positives, args.output, args.baseline)
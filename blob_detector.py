@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+from detection_cache import normalize_boxes
+from detection_stage import no_detections
+from profiler import DISABLED
+
+class BlobDetector():
+    def __init__(self, mask: np.ndarray, history: int = 200, var_threshold: float = 16, min_area: int = 12, max_area: int = 2000) -> None:
+        '''
+        Detector that doesn't need YOLO. The droplets are high contrast blobs moving over a background that doesn't change, so a background
+        subtractor finds the pixels that are moving and connected components groups them in to blobs. Only pixels inside mask (the course from
+        CourseLookup.mask, the size of the frame) are considered. Blobs smaller than min_area or bigger than max_area pixels are noise or glare.
+        Rows come out as [x1, y1, x2, y2, conf, cls] like result.boxes.data so the tracker doesn't know which detector it's using.
+        The confidence is how much of its box the blob fills, a round droplet fills about 0.8 of it.
+        '''
+        self.mask = mask.astype(np.uint8) * 255
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=history, varThreshold=var_threshold, detectShadows=False)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.min_area = min_area
+        self.max_area = max_area
+
+    def detect_frame(self, frame: np.ndarray) -> np.ndarray:
+        '''Returns the (N, 6) detections of the next frame. Frames have to be given in order since the background is learnt from them'''
+        foreground = self.subtractor.apply(frame)
+        foreground = cv2.bitwise_and(foreground, self.mask)
+        foreground = cv2.morphologyEx(foreground, cv2.MORPH_OPEN, self.kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(foreground, connectivity=8)
+        stats = stats[1:]
+        areas = stats[:, cv2.CC_STAT_AREA]
+        stats = stats[(areas >= self.min_area) & (areas <= self.max_area)]
+
+        x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+        width, height = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+        confidence = np.clip(stats[:, cv2.CC_STAT_AREA] / (width * height), 0, 1)
+        return np.column_stack((x, y, x + width, y + height, confidence, np.zeros(len(stats)))).astype(np.float32)
+
+    def batches(self, reader, gate=None, profiler=DISABLED):
+        '''Yields (packet, boxes) for every frame the FrameReader decodes, the same as BatchedDetector.batches so main can use either.
+        Frames go through one at a time, there's nothing to gain from batching here. Frames the optional MotionGate skips get no detections'''
+        while True:
+            with profiler.stage("decode"):
+                packet = reader.next()
+            if packet is None:
+                return
+            with profiler.stage("gate"):
+                skip = gate and not gate.should_detect(packet.frame)
+            if skip:
+                yield packet, no_detections()
+            else:
+                with profiler.stage("detect"):
+                    boxes = normalize_boxes(self.detect_frame(packet.frame))
+                yield packet, boxes
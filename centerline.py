@@ -0,0 +1,97 @@
+import numpy as np
+from arc_length import ArcLengthTable
+
+class Centerline():
+    def __init__(self, table: ArcLengthTable, segment_starts: np.ndarray, sample_segments: np.ndarray = None) -> None:
+        '''
+        The whole course compiled into one continuous path. A droplet's place on the course is a single number s, how far along the path it is,
+        plus a lateral offset to the side of the path. table is the path sampled every table.spacing pixels and segment_starts holds the s each
+        segment of Path.segments_in_order starts at, so the segment a droplet is in is a searchsorted instead of bounding box checks.
+        sample_segments is the segment of every sample of the table, computed here unless it comes from a compiled course. Samples go along
+        the path so every segment's samples are in one run, sample_bounds[i]:sample_bounds[i + 1] are segment i's.
+        '''
+        self.table = table
+        self.length = table.length
+        self.segment_starts = segment_starts
+        if sample_segments is None:
+            sample_segments = self.segment_of(np.arange(len(table.points)) * table.spacing)
+        self.sample_segments = sample_segments
+        self.sample_bounds = np.searchsorted(sample_segments, np.arange(len(segment_starts) + 1))
+
+    def segment_of(self, distances) -> np.ndarray:
+        '''Returns the index of the segment each distance along the path is in'''
+        indices = np.searchsorted(self.segment_starts, np.asarray(distances, dtype=float), side='right') - 1
+        return np.clip(indices, 0, len(self.segment_starts) - 1)
+
+    def to_pixels(self, distances, lateral_offsets=0) -> np.ndarray:
+        '''Turns path positions back into (x, y) points. Returns an (N, 2) array'''
+        distances = np.asarray(distances, dtype=float).reshape(-1)
+        points = self.table.points_at(distances)
+        if np.any(lateral_offsets):
+            tangents = self.table.tangents_at(distances)
+            normals = np.column_stack((-tangents[:, 1], tangents[:, 0]))
+            points = points + normals * np.asarray(lateral_offsets, dtype=float).reshape(-1, 1)
+        return points
+
+    def project(self, points, segments=None) -> (np.ndarray, np.ndarray):
+        '''
+        Turns (x, y) points into path positions, returns the distance along the path and the signed lateral offset of each point.
+        Where the course runs close to itself a point could be nearest to the wrong part of the path, so if the segment each point is in is
+        known (from the course lookup) only that segment's samples are searched, so the cost doesn't grow with the length of the course.
+        Points with no segment (None or a negative index) are searched against the whole path.
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        segments = np.full(len(points), -1) if segments is None else np.asarray(segments).reshape(-1)
+        closest = np.zeros(len(points), dtype=np.int64)
+        for segment in np.unique(segments).tolist():
+            rows = np.flatnonzero(segments == segment)
+            start, end = 0, len(self.table.points)
+            if segment >= 0 and self.sample_bounds[segment] < self.sample_bounds[segment + 1]:
+                start, end = self.sample_bounds[segment], self.sample_bounds[segment + 1]
+            difference = points[rows, None, :] - self.table.points[None, start:end, :]
+            closest[rows] = start + np.argmin((difference ** 2).sum(axis=2), axis=1)
+        distances = closest * self.table.spacing
+
+        tangents = self.table.tangents[closest]
+        offsets = points - self.table.points[closest]
+        lateral_offsets = tangents[:, 0] * offsets[:, 1] - tangents[:, 1] * offsets[:, 0]
+        return distances, lateral_offsets
+
+def segment_polyline(segment) -> np.ndarray:
+    '''
+    The path a droplet takes through one segment. Curves use their arc length table. Straights are the line through the middle of the box
+    from the side the droplet comes in to the side it leaves, assuming straights are perfectly vertical or horizontal.
+    '''
+    arc_table = getattr(segment, 'arc_table', None)
+    if arc_table is not None:
+        return arc_table.points
+    (x1, y1), (x2, y2) = segment.top_left, segment.bottom_right
+    center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+    direction_x, direction_y = segment.direction
+    if direction_x and not direction_y:
+        xs = (x1, x2) if direction_x > 0 else (x2, x1)
+        return np.array([(xs[0], center_y), (xs[1], center_y)], dtype=float)
+    ys = (y1, y2) if direction_y > 0 else (y2, y1)
+    return np.array([(center_x, ys[0]), (center_x, ys[1])], dtype=float)
+
+def build_centerline(course, spacing: float = 1.0) -> Centerline:
+    '''
+    Compiles the course into a Centerline by chaining every segment's path in order. The gap between the end of one segment's path and the
+    start of the next one is joined with a straight line and counts as part of the earlier segment. The chained path is then resampled every
+    spacing pixels so that any path position is an O(1) lookup.
+    '''
+    vertices = []
+    vertex_segment_starts = []
+    for segment in course.segments_in_order:
+        vertex_segment_starts.append(len(vertices))
+        vertices.extend(segment_polyline(segment).tolist())
+    vertices = np.array(vertices, dtype=float)
+
+    travelled = np.concatenate(([0], np.cumsum(np.linalg.norm(np.diff(vertices, axis=0), axis=1))))
+    segment_starts = travelled[vertex_segment_starts]
+
+    samples = max(int(np.ceil(travelled[-1] / spacing)) + 1, 2)
+    spacing = travelled[-1] / (samples - 1) if travelled[-1] else spacing
+    distances = np.arange(samples) * spacing
+    points = np.column_stack((np.interp(distances, travelled, vertices[:, 0]), np.interp(distances, travelled, vertices[:, 1])))
+    return Centerline(ArcLengthTable(points, spacing), segment_starts)
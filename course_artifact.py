@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import numpy as np
+from arc_length import ArcLengthTable
+from centerline import Centerline, build_centerline
+from course_file import read_course_boxes, INTERFACE_SIZE
+from course_lookup import build_course_lookup
+from detection_cache import file_hash
+
+MAGIC = b"DSCOURSE"
+VERSION = 2
+ALIGNMENT = 64
+
+def align(offset: int) -> int:
+    '''Rounds offset up so every array starts on a 64 byte boundary'''
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def artifact_path(source_path: str, frame_size: (int, int)) -> str:
+    '''Where the compiled course for a course file at frame_size is kept, next to the course file'''
+    return f"{os.path.splitext(source_path)[0]}.{frame_size[0]}x{frame_size[1]}.course"
+
+def compile_course(source_path: str, frame_size: (int, int), build_course, path: str = None, interface_size: (int, int) = INTERFACE_SIZE) -> str:
+    '''
+    Compiles a course saved by the bounding box interface into one binary file so the tracker doesn't redo the work every time it starts.
+    build_course turns the boxes into a Path (droplet_tracker's build_course_from_boxes). The file holds the segment table, every curve's arc length
+    table, the centerline and the pixel to segment raster at frame_size, along with the version and a hash of the source
+    file so a stale artifact is noticed. The file starts with MAGIC, the length of a JSON header and the header, the arrays come after it
+    each at an aligned offset so they can be memory mapped. Written to a temporary file first so a half written artifact is never loaded.
+    Returns the path it was written to (artifact_path unless path is given).
+    '''
+    path = path or artifact_path(source_path, frame_size)
+    boxes = read_course_boxes(source_path, frame_size, interface_size)
+    course = build_course(boxes)
+    segments = course.segments_in_order
+    course_lookup = build_course_lookup(course, frame_size)
+    centerline = build_centerline(course)
+
+    '''Segment table rows are [is curve, top left x, top left y, bottom right x, bottom right y, direction x, direction y]. Straights have
+    no arc length samples, curve_offsets[i]:curve_offsets[i + 1] are segment i's rows of curve_points'''
+    table = np.zeros((len(segments), 7), dtype=np.int32)
+    curve_offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    curve_spacings = np.zeros(len(segments))
+    curve_points, curve_tangents = [np.zeros((0, 2))], [np.zeros((0, 2))]
+    for index, segment in enumerate(segments):
+        arc_table = getattr(segment, 'arc_table', None)
+        table[index] = (arc_table is not None, *segment.top_left, *segment.bottom_right, *segment.direction)
+        samples = 0
+        if arc_table is not None:
+            curve_spacings[index] = arc_table.spacing
+            curve_points.append(arc_table.points)
+            curve_tangents.append(arc_table.tangents)
+            samples = len(arc_table.points)
+        curve_offsets[index + 1] = curve_offsets[index] + samples
+
+    arrays = {"segments": table, "label_image": course_lookup.label_image, "curve_offsets": curve_offsets,
+              "curve_spacings": curve_spacings, "curve_points": np.concatenate(curve_points), "curve_tangents": np.concatenate(curve_tangents),
+              "centerline_points": centerline.table.points, "centerline_tangents": centerline.table.tangents,
+              "segment_starts": np.asarray(centerline.segment_starts, dtype=float), "sample_segments": centerline.sample_segments}
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header = {"version": VERSION, "source_hash": file_hash(source_path), "frame_size": list(frame_size), "interface_size": list(interface_size),
+              "boxes": boxes, "centerline_spacing": centerline.table.spacing, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = align(offset + array.nbytes)
+
+    encoded = json.dumps(header).encode()
+    data_start = align(len(MAGIC) + 8 + len(encoded))
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(MAGIC)
+        file.write(len(encoded).to_bytes(8, "little"))
+        file.write(encoded)
+        for name, array in arrays.items():
+            file.seek(data_start + header["arrays"][name]["offset"])
+            file.write(array.tobytes())
+    os.replace(temporary, path)
+    return path
+
+def read_header(path: str) -> dict:
+    '''Reads just the header of a compiled course, raises ValueError if the file isn't one'''
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a compiled course")
+        length = int.from_bytes(file.read(8), "little")
+        header = json.loads(file.read(length))
+    header["data_start"] = align(len(MAGIC) + 8 + length)
+    return header
+
+class CompiledCourse():
+    def __init__(self, path: str) -> None:
+        '''
+        A compiled course opened without recomputing anything. The arrays are memory mapped read only so opening one takes about the same
+        time however big the course is, pages of the raster are only read from disk when they're looked at.
+        boxes are the scaled bounding boxes, label_image is the raster for a CourseLookup and centerline is ready to use.
+        '''
+        header = read_header(path)
+        if header["version"] != VERSION:
+            raise ValueError(f"{path} is version {header['version']} of the compiled course format, this is version {VERSION}")
+        self.path = path
+        self.header = header
+        self.frame_size = tuple(header["frame_size"])
+        self.arrays = {}
+        for name, array in header["arrays"].items():
+            shape = tuple(array["shape"])
+            if not np.prod(shape):
+                self.arrays[name] = np.zeros(shape, dtype=array["dtype"])
+            else:
+                self.arrays[name] = np.memmap(path, dtype=array["dtype"], mode='r', offset=header["data_start"] + array["offset"], shape=shape)
+
+        self.boxes = []
+        for box in header["boxes"]:
+            number, kind, direction, (top_left, bottom_right) = box[:4]
+            scaled_box = [number, kind, tuple(direction), [tuple(top_left), tuple(bottom_right)]]
+            if kind != "straight":
+                scaled_box += [tuple(box[4]), [tuple(box[5][0]), tuple(box[5][1])]]
+            self.boxes.append(scaled_box)
+        self.label_image = self.arrays["label_image"]
+        self.segments = self.arrays["segments"]
+        table = ArcLengthTable(self.arrays["centerline_points"], header["centerline_spacing"], self.arrays["centerline_tangents"])
+        self.centerline = Centerline(table, self.arrays["segment_starts"], self.arrays["sample_segments"])
+
+    def curve(self, index: int) -> ArcLengthTable:
+        '''The arc length table of the curve that's segment index'''
+        start, end = self.arrays["curve_offsets"][index:index + 2].tolist()
+        return ArcLengthTable(self.arrays["curve_points"][start:end], float(self.arrays["curve_spacings"][index]),
+                              self.arrays["curve_tangents"][start:end])
+
+def load_course(source_path: str, frame_size: (int, int), build_course, interface_size: (int, int) = INTERFACE_SIZE) -> CompiledCourse:
+    '''Opens the compiled version of a course file, compiling it first if there isn't one or it's stale: a different format version,
+    the course file changed since (its hash doesn't match) or it was compiled for another frame or interface size'''
+    path = artifact_path(source_path, frame_size)
+    try:
+        header = read_header(path)
+        fresh = (header["version"] == VERSION and header["source_hash"] == file_hash(source_path)
+                 and header["frame_size"] == list(frame_size) and header["interface_size"] == list(interface_size))
+    except (OSError, ValueError):
+        fresh = False
+    if not fresh:
+        compile_course(source_path, frame_size, build_course, path, interface_size)
+    return CompiledCourse(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile a course saved by the bounding box interface for the tracker to memory map")
+    parser.add_argument("course", help="Course file saved by the bounding box interface")
+    parser.add_argument("--frame-size", type=int, nargs=2, required=True, metavar=("WIDTH", "HEIGHT"), help="Size of the video frames the course is for")
+    args = parser.parse_args()
+    from droplet_tracker import build_course_from_boxes
+    print("Compiled to", compile_course(args.course, tuple(args.frame_size), build_course_from_boxes))
@@ -0,0 +1,26 @@
+import json
+
+INTERFACE_SIZE = (1440, 900)
+
+def read_course_boxes(path: str, frame_size: (int, int), interface_size: (int, int) = INTERFACE_SIZE) -> list:
+    '''
+    Reads a course saved by the bounding box interface and scales it from the interface's resolution to frame_size (width, height), the same
+    as the interface's set_resolution does before handing the boxes to the tracker. Every box is
+    [number, "straight" or "curved", direction, [top left, bottom right]] and curves also have [..., middle, [start, end]].
+    '''
+    with open(path, 'r') as file:
+        boxes = json.load(file)
+    x_scale = frame_size[0] / interface_size[0]
+    y_scale = frame_size[1] / interface_size[1]
+
+    def scale(point) -> (int, int):
+        return (int(point[0] * x_scale), int(point[1] * y_scale))
+
+    scaled = []
+    for box in boxes:
+        number, kind, direction, (top_left, bottom_right) = box[:4]
+        scaled_box = [number, kind, tuple(direction), [scale(top_left), scale(bottom_right)]]
+        if kind != "straight":
+            scaled_box += [scale(box[4]), [scale(box[5][0]), scale(box[5][1])]]
+        scaled.append(scaled_box)
+    return scaled
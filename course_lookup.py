@@ -0,0 +1,83 @@
+import numpy as np
+
+OFF_COURSE = -1
+
+class CourseLookup():
+    def __init__(self, label_image: np.ndarray, segments: list) -> None:
+        '''Initialize the compiled course lookup.
+        label_image is an int16 raster the size of the course where every pixel holds the index of the segment it belongs to
+        (or OFF_COURSE = -1 if it isn't inside any segment). segments is the segment table, the same order as Path.segments_in_order
+        so label_image[y, x] can be turned straight back into a Straight or Curve object.
+        '''
+        self.label_image = label_image
+        self.segments = segments
+        self.height, self.width = label_image.shape
+
+    def segment_index_at(self, point: (int, int)) -> int:
+        '''Returns the index of the segment a single (x, y) point is in, or OFF_COURSE if the point is outside of the course'''
+        x, y = int(point[0]), int(point[1])
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return OFF_COURSE
+        return int(self.label_image[y, x])
+
+    def segment_at(self, point: (int, int)):
+        '''Returns the segment object a single (x, y) point is in. None replaces the old KeyError of the x_y_map for detections off the course'''
+        index = self.segment_index_at(point)
+        if index == OFF_COURSE:
+            return None
+        return self.segments[index]
+
+    def segment_indices(self, points) -> np.ndarray:
+        '''Vectorized version of segment_index_at. Takes an (N, 2) array of (x, y) points such as every detection midpoint in a frame
+        and returns an (N,) int array of segment indices with OFF_COURSE for points outside of the course'''
+        points = np.asarray(points)
+        ret = np.full(len(points), OFF_COURSE, dtype=np.int16)
+        if not len(points):
+            return ret
+        xs = points[:, 0].astype(np.int64)
+        ys = points[:, 1].astype(np.int64)
+        inside = (xs >= 0) & (ys >= 0) & (xs < self.width) & (ys < self.height)
+        ret[inside] = self.label_image[ys[inside], xs[inside]]
+        return ret
+
+    def mask(self) -> np.ndarray:
+        '''Returns a boolean mask of every pixel that is part of the course'''
+        return self.label_image != OFF_COURSE
+
+    def bounds(self, margin: int = 0, frame_size: (int, int) = None) -> (int, int, int, int):
+        '''Returns the (x1, y1, x2, y2) rectangle around every segment grown by margin pixels, so frame[y1:y2, x1:x2] is all of the course.
+        Droplets sitting on the edge of a segment stick out of it which is what the margin is for. frame_size is an optional (width, height)
+        the rectangle is kept inside of. Returns None if the course is empty'''
+        mask = self.mask()
+        rows = np.flatnonzero(mask.any(axis=1))
+        columns = np.flatnonzero(mask.any(axis=0))
+        if not len(rows):
+            return None
+        x1, y1 = max(int(columns[0]) - margin, 0), max(int(rows[0]) - margin, 0)
+        x2, y2 = int(columns[-1]) + 1 + margin, int(rows[-1]) + 1 + margin
+        if frame_size:
+            x2, y2 = min(x2, frame_size[0]), min(y2, frame_size[1])
+        return (x1, y1, x2, y2)
+
+def build_course_lookup(course, frame_size: (int, int) = None) -> CourseLookup:
+    '''
+    Compiles the course into a CourseLookup. Replaces build_x_y_map, instead of one dictionary entry per pixel every segment box is painted
+    into a single int16 image with numpy slicing. Segments are painted in order so that where two boxes overlap the later segment wins,
+    which is the same behaviour the dictionary had when the later segment overwrote the key.
+    frame_size is an optional (width, height), if it isn't given the raster is only as large as the course itself.
+    '''
+    segments = list(course.segments_in_order)
+    if frame_size:
+        width, height = frame_size
+    else:
+        width = max(max(segment.top_left[0], segment.bottom_right[0]) for segment in segments) + 1 if segments else 0
+        height = max(max(segment.top_left[1], segment.bottom_right[1]) for segment in segments) + 1 if segments else 0
+
+    label_image = np.full((height, width), OFF_COURSE, dtype=np.int16)
+    for index, segment in enumerate(segments):
+        x1, y1 = segment.top_left
+        x2, y2 = segment.bottom_right
+        smaller_x, bigger_x = max(min(x1, x2), 0), max(x1, x2)
+        smaller_y, bigger_y = max(min(y1, y2), 0), max(y1, y2)
+        label_image[smaller_y:bigger_y + 1, smaller_x:bigger_x + 1] = index
+    return CourseLookup(label_image, segments)
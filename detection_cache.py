@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+CACHE_VERSION = 1
+COLUMNS = ("x1", "y1", "x2", "y2", "track_id", "confidence", "class_id")
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    '''sha256 of a file read in chunks so a long video never has to fit in memory'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(video_path: str, weights_path: str, settings: dict) -> str:
+    '''The key a run's detections are stored under. Changing the video, the weights or any inference setting gives a new key.
+    weights_path is None for detectors that don't have a weights file'''
+    digest = hashlib.sha256()
+    digest.update(file_hash(video_path).encode())
+    if weights_path:
+        digest.update(file_hash(weights_path).encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(str(CACHE_VERSION).encode())
+    return digest.hexdigest()
+
+def cache_path(cache_dir: str, video_path: str, weights_path: str, settings: dict) -> str:
+    '''Where the detections for this video, weights and settings are cached'''
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(cache_dir, f"{name}-{cache_key(video_path, weights_path, settings)[:16]}.npz")
+
+def normalize_boxes(data) -> np.ndarray:
+    '''
+    Turns a frame's result.boxes.data into a (N, 7) float32 array of x1, y1, x2, y2, track id, confidence, class.
+    The tracker leaves out the id column when it has no tracks yet, those rows get a track id of -1 so every frame has the same columns.
+    '''
+    boxes = np.asarray(data, dtype=np.float32)
+    if boxes.ndim != 2 or not boxes.size:
+        return np.zeros((0, len(COLUMNS)), dtype=np.float32)
+    if boxes.shape[1] == 6:
+        boxes = np.insert(boxes, 4, -1, axis=1)
+    return boxes
+
+class DetectionRecorder():
+    def __init__(self, key: str = "") -> None:
+        '''Collects every frame's detections during a live run so they can be saved and replayed later'''
+        self.key = key
+        self.frames = []
+
+    def add(self, boxes: np.ndarray) -> None:
+        '''Adds the next frame's (N, 7) detections'''
+        self.frames.append(boxes)
+
+    def save(self, path: str) -> None:
+        '''Writes the detections as one array per column plus the offset each frame starts at. Written to a temporary file first
+        so an interrupted save never leaves a half written cache behind'''
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        counts = np.array([len(boxes) for boxes in self.frames], dtype=np.int64)
+        frame_offsets = np.concatenate(([0], np.cumsum(counts)))
+        data = np.concatenate(self.frames) if self.frames else np.zeros((0, len(COLUMNS)), dtype=np.float32)
+        columns = {column: data[:, i] for i, column in enumerate(COLUMNS)}
+        temporary = path + ".tmp.npz"
+        np.savez(temporary, version=CACHE_VERSION, key=self.key, frame_offsets=frame_offsets, **columns)
+        os.replace(temporary, path)
+
+class DetectionReplay():
+    def __init__(self, path: str) -> None:
+        '''Loads a saved run's detections in to memory so every frame's detections are an array slice'''
+        with np.load(path) as saved:
+            if int(saved['version']) != CACHE_VERSION:
+                raise ValueError(f"Detection cache {path} is version {int(saved['version'])}, expected {CACHE_VERSION}")
+            self.frame_offsets = saved['frame_offsets']
+            self.data = np.column_stack([saved[column] for column in COLUMNS]).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.frame_offsets) - 1
+
+    def frame(self, index: int) -> np.ndarray:
+        '''Returns the (N, 7) detections of frame index (0 based)'''
+        return self.data[self.frame_offsets[index]:self.frame_offsets[index + 1]]
+
+def open_replay(path: str):
+    '''Returns the DetectionReplay saved at path, or None if there isn't a usable one'''
+    if not os.path.exists(path):
+        return None
+    try:
+        return DetectionReplay(path)
+    except (ValueError, KeyError, OSError) as e:
+        print("Ignoring detection cache", path, e)
+        return None
@@ -0,0 +1,141 @@
+import queue
+import time
+import numpy as np
+from detection_cache import normalize_boxes, COLUMNS
+from profiler import DISABLED
+
+def crop(frame, roi: (int, int, int, int)):
+    '''The part of the frame inside roi (x1, y1, x2, y2), a view so nothing is copied. The whole frame when there's no roi'''
+    if roi is None:
+        return frame
+    x1, y1, x2, y2 = roi
+    return frame[y1:y2, x1:x2]
+
+def no_detections() -> np.ndarray:
+    '''The (0, 7) detections of a frame detection was skipped on'''
+    return np.zeros((0, len(COLUMNS)), dtype=np.float32)
+
+def to_frame_coordinates(boxes, roi: (int, int, int, int)):
+    '''Moves (N, 7) detections made on a crop back to where they are in the full frame'''
+    if roi is not None and len(boxes):
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] += roi[0]
+        boxes[:, [1, 3]] += roi[1]
+    return boxes
+
+class YoloBackend():
+    def __init__(self, model, **predict_settings) -> None:
+        '''Runs the ultralytics model with PyTorch. Backends turn a list of images in to a list of (N, 7) detections, one per image'''
+        self.model = model
+        self.predict_settings = predict_settings
+
+    def detect(self, images: list) -> list:
+        results = self.model.predict(images, verbose=False, **self.predict_settings)
+        return [normalize_boxes(result.boxes.data.cpu().numpy()) for result in results]
+
+def load_backend(runtime: str, weights_path: str, threads: int = None):
+    '''Loads the backend for runtime ("torch" or "onnx") from the weights. For when the model has to be loaded somewhere else than main,
+    like in a pipeline worker process'''
+    if runtime == "onnx":
+        from onnx_backend import OnnxBackend, export_onnx
+        return OnnxBackend(export_onnx(weights_path), threads)
+    from ultralytics import YOLO
+    return YoloBackend(YOLO(weights_path))
+
+class BatchedDetector():
+    def __init__(self, backend, batch_size: int = 8, max_latency: float = 0.05, roi: (int, int, int, int) = None) -> None:
+        '''
+        Runs the backend (YoloBackend or OnnxBackend) on batch_size frames in one call instead of one call per frame. On CPU that saves the
+        per call overhead and keeps every thread busy. A batch is sent early if max_latency seconds pass waiting for it to fill up, so a slow
+        video source never holds frames back for long.
+        There's no bytetrack here since its persist state has to see frames one at a time, ids come from the tracker's own association.
+        roi is the optional (x1, y1, x2, y2) part of the frame the model is run on, detections are still in full frame coordinates.
+        '''
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.roi = roi
+
+    def detect(self, frames: list) -> list:
+        '''Returns the (N, 7) detections of every frame in frames, in order'''
+        if not frames:
+            return []
+        detections = self.backend.detect([crop(frame, self.roi) for frame in frames])
+        return [to_frame_coordinates(boxes, self.roi) for boxes in detections]
+
+    def batches(self, reader, gate=None, profiler=DISABLED):
+        '''Yields (packet, boxes) for every frame the FrameReader decodes, in order. Frames are collected until the batch is full or
+        max_latency runs out, then detected together. A frame's slot is handed back to the reader once the tracker asks for the next frame.
+        Frames the optional MotionGate skips are left out of the predict call and get no detections.
+        The profiler times waiting for a batch's frames as decode and each predict call (a whole batch) as detect'''
+        finished = False
+        while not finished:
+            with profiler.stage("decode"):
+                packet = reader.next(hold=True)
+                if packet is None:
+                    return
+                batch = [packet]
+                deadline = time.perf_counter() + self.max_latency
+                while len(batch) < self.batch_size:
+                    try:
+                        packet = reader.next(timeout=max(deadline - time.perf_counter(), 0), hold=True)
+                    except queue.Empty:
+                        break
+                    if packet is None:
+                        finished = True
+                        break
+                    batch.append(packet)
+
+            with profiler.stage("gate"):
+                wanted = [gate.should_detect(packet.frame) if gate else True for packet in batch]
+            with profiler.stage("detect"):
+                detected = iter(self.detect([packet.frame for packet, want in zip(batch, wanted) if want]))
+            for packet, want in zip(batch, wanted):
+                yield packet, next(detected) if want else no_detections()
+                reader.release(packet)
+
+def detection_frames(reader, replay=None, model=None, detector: BatchedDetector = None, recorder=None, track_settings: dict = None,
+                     roi: (int, int, int, int) = None, gate=None, profiler=DISABLED):
+    '''
+    Yields (frame, boxes) for every frame of the video in order, boxes being the frame's (N, 7) detections. Where the detections come from is
+    decided here so the tracker loop is the same for all of them: replayed from the detection cache (frame is None when there's no reader),
+    batched through a BatchedDetector, or one frame at a time through model.track. Live detections are added to the recorder if there is one.
+    roi is the optional (x1, y1, x2, y2) part of the frame model.track is run on, the detector has its own.
+    gate is an optional MotionGate, frames it skips get no detections so the tracker's predictions carry them.
+    profiler times waiting for decoded frames as decode and running the model as detect.
+    '''
+    if replay:
+        for index in range(len(replay)):
+            frame = None
+            if reader:
+                with profiler.stage("decode"):
+                    packet = reader.next()
+                if packet is None:
+                    return
+                frame = packet.frame
+            yield frame, replay.frame(index)
+        return
+
+    if detector:
+        for packet, boxes in detector.batches(reader, gate, profiler):
+            if recorder:
+                recorder.add(boxes)
+            yield packet.frame, boxes
+        return
+
+    while True:
+        with profiler.stage("decode"):
+            packet = reader.next()
+        if packet is None:
+            return
+        with profiler.stage("gate"):
+            skip = gate and not gate.should_detect(packet.frame)
+        if skip:
+            boxes = no_detections()
+        else:
+            with profiler.stage("detect"):
+                result = model.track(crop(packet.frame, roi), **(track_settings or {}))[0]
+                boxes = to_frame_coordinates(normalize_boxes(result.boxes.data.cpu().numpy()), roi)
+        if recorder:
+            recorder.add(boxes)
+        yield packet.frame, boxes
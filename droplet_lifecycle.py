@@ -0,0 +1,61 @@
+import numpy as np
+
+SPAWNED, ACTIVE, COASTING, EXITED, LOST = range(5)
+STATE_NAMES = ("spawned", "active", "coasting", "exited", "lost")
+
+class DropletLifecycle():
+    def __init__(self, store, motion, end_of_course: float, lost_after: int = 90, exit_margin: float = 2.0) -> None:
+        '''
+        Keeps track of what state every droplet in the DropletStore is in so finished droplets can be dropped instead of being tracked forever.
+        spawned: registered but not detected yet. active: matched to a detection this frame. coasting: not detected this frame, the motion
+        model's prediction is carrying it. exited: its path position reached end_of_course (the centerline's length) less exit_margin pixels.
+        lost: not detected for more than lost_after frames. self.spawned counts every droplet passed to spawn.
+        Exited and lost droplets are retired, they're taken out of the store and the motion model so every frame only costs as much as the
+        droplets that are still on the course. The state lives in the store's state column so it's written to the tracks with everything else.
+        '''
+        self.store = store
+        self.motion = motion
+        self.end_of_course = end_of_course
+        self.lost_after = lost_after
+        self.exit_margin = exit_margin
+        self.spawned = 0
+        self.retired = {"exited": 0, "lost": 0}
+
+    def spawn(self, droplet_ids: list, t: int) -> None:
+        '''Starts the clock of droplets put on the course on frame t and counts them'''
+        slots = self.store.slots(droplet_ids)
+        self.store.state[slots] = SPAWNED
+        self.store.last_seen[slots] = t
+        self.spawned += len(slots)
+
+    def observe(self, droplet_ids: list, t: int) -> None:
+        '''Marks the droplets matched to a detection on frame t as active'''
+        slots = self.store.slots(droplet_ids)
+        self.store.state[slots] = ACTIVE
+        self.store.last_seen[slots] = t
+
+    def step(self, t: int) -> np.ndarray:
+        '''
+        Updates the state of every droplet after frame t has been tracked, all in one go over the store's columns. A droplet's clock starts
+        on the frame it was spawned. Returns the slots of the droplets that exited or were lost this frame, they should be written out
+        before retire is called on them.
+        '''
+        store = self.store
+        slots = store.active_slots()
+        unseen = t - store.last_seen[slots]
+        state = store.state[slots]
+        state[(state != SPAWNED) & (unseen > 0)] = COASTING
+        state[unseen > self.lost_after] = LOST
+        state[store.path_position[slots] >= self.end_of_course - self.exit_margin] = EXITED
+        store.state[slots] = state
+        return slots[(state == EXITED) | (state == LOST)]
+
+    def retire(self, slots: np.ndarray) -> list:
+        '''Takes the droplets in slots out of the store and the motion model. Returns their Droplet objects, which can still be read'''
+        drops = self.store.views[slots].tolist()
+        for drop in drops:
+            self.retired[STATE_NAMES[drop.state]] += 1
+            if drop.id in self.motion:
+                self.motion.remove(drop.id)
+            self.store.remove(drop.id)
+        return drops
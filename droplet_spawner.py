@@ -0,0 +1,93 @@
+import json
+import numpy as np
+from course_lookup import OFF_COURSE
+
+def read_schedule(path: str) -> [dict]:
+    '''Reads a spawn schedule from a JSON file, a list of the droplets to start like
+    [{"frame": 1, "id": 1, "x": 450, "y": 60, "trajectory": 2, "section": 0}, ...]. trajectory and section can be left out'''
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def read_dispensers(path: str) -> [((int, int), (int, int))]:
+    '''Reads the dispenser rectangles from a JSON file, a list of [top left, bottom right] in frame pixels like [[[445, 55], [455, 65]], ...]'''
+    with open(path, 'r') as file:
+        return [(tuple(top_left), tuple(bottom_right)) for top_left, bottom_right in json.load(file)]
+
+class DispenserSpawner():
+    def __init__(self, dispensers: [((int, int), (int, int))], droplet_type, trajectory: float = 1, cooldown: int = 5, first_id: int = 1,
+                 max_jump: float = 40) -> None:
+        '''
+        Starts tracking a new droplet whenever a detection that no droplet was matched to shows up inside one of the dispensers, the
+        rectangles in front of each dispenser that where_droplets_should_start draws. Replaces writing out a frame schedule for every video.
+        droplet_type is the Droplet class to make them with, every new droplet gets the next id and starts moving trajectory pixels a frame.
+        A slow droplet can take longer than any fixed wait to leave its dispenser, so a dispenser doesn't spawn while a live droplet is still
+        inside it, and a detection isn't a new droplet if a live droplet is within max_jump pixels of it (the association's gate), it's
+        that droplet seen late. On top of that a dispenser waits cooldown frames after it spawns a droplet.
+        '''
+        self.dispensers = dispensers
+        self.boxes = np.array([(x1, y1, x2, y2) for (x1, y1), (x2, y2) in dispensers], dtype=float).reshape(-1, 4)
+        self.droplet_type = droplet_type
+        self.trajectory = trajectory
+        self.cooldown = cooldown
+        self.max_jump = max_jump
+        self.next_id = first_id
+        self.last_spawn = np.full(len(self.boxes), -cooldown, dtype=np.int64)
+
+    def spawn(self, t: int) -> list:
+        '''Nothing is known about a frame before its detections are matched, droplets only come from spawn_from'''
+        return []
+
+    def spawn_from(self, t: int, mids: [(int, int)], segment_indices: np.ndarray, unmatched_detections: [int], droplet_points=None) -> list:
+        '''
+        Returns the Droplets that start on frame t. Every unmatched detection that's on the course is tested against every dispenser at once,
+        each dispenser that's ready spawns at most one droplet a frame at the first detection inside it. droplet_points are the (x, y) of
+        every live droplet, a dispenser with one of them inside it or a detection with one of them near it doesn't spawn.
+        '''
+        if not len(unmatched_detections) or not len(self.boxes):
+            return []
+        candidates = np.asarray(unmatched_detections)
+        points = np.asarray(mids, dtype=float).reshape(-1, 2)[candidates]
+        x, y = points[:, 0:1], points[:, 1:2]
+        inside = (x >= self.boxes[:, 0]) & (x <= self.boxes[:, 2]) & (y >= self.boxes[:, 1]) & (y <= self.boxes[:, 3])
+        inside &= (np.asarray(segment_indices)[candidates] != OFF_COURSE)[:, None]
+        inside &= (t - self.last_spawn >= self.cooldown)[None, :]
+        if droplet_points is not None and len(droplet_points):
+            live = np.asarray(droplet_points, dtype=float).reshape(-1, 2)
+            near = ((points[:, None, :] - live[None, :, :]) ** 2).sum(axis=2) <= self.max_jump ** 2
+            live_x, live_y = live[:, 0:1], live[:, 1:2]
+            occupied = ((live_x >= self.boxes[:, 0]) & (live_x <= self.boxes[:, 2]) & (live_y >= self.boxes[:, 1]) & (live_y <= self.boxes[:, 3]))
+            inside &= ~near.any(axis=1)[:, None] & ~occupied.any(axis=0)[None, :]
+
+        drops = []
+        used = set()
+        for dispenser in np.flatnonzero(inside.any(axis=0)).tolist():
+            detection = int(candidates[np.argmax(inside[:, dispenser])])
+            if detection in used:
+                continue
+            used.add(detection)
+            x, y = mids[detection]
+            drops.append(self.droplet_type(self.next_id, x, y, self.trajectory, int(segment_indices[detection])))
+            self.next_id += 1
+            self.last_spawn[dispenser] = t
+        return drops
+
+class ScheduledSpawner():
+    def __init__(self, schedule: [dict], droplet_type) -> None:
+        '''
+        Starts droplets on the frames a schedule says to (see read_schedule), for replays that have to start the same droplets at the same
+        place every time. The schedule is indexed by frame once so a frame's droplets are a single dict pop instead of checking every entry.
+        Has the same spawn / spawn_from methods as DispenserSpawner so the tracker doesn't care which one it has.
+        '''
+        self.droplet_type = droplet_type
+        self.by_frame = {}
+        for entry in schedule:
+            self.by_frame.setdefault(int(entry["frame"]), []).append(entry)
+
+    def spawn(self, t: int) -> list:
+        '''Returns the Droplets that start on frame t, before that frame's detections are matched'''
+        return [self.droplet_type(entry["id"], entry["x"], entry["y"], entry.get("trajectory", 1), entry.get("section", 0))
+                for entry in self.by_frame.pop(t, [])]
+
+    def spawn_from(self, t: int, mids: [(int, int)], segment_indices: np.ndarray, unmatched_detections: [int], droplet_points=None) -> list:
+        '''Scheduled droplets don't depend on the detections'''
+        return []
@@ -0,0 +1,106 @@
+import numpy as np
+
+'''Every column of the store with its dtype and the value a fresh slot starts with. NaN is "not set yet" for the optional float columns
+and a last_seen of -1 means the DropletLifecycle hasn't spawned the droplet yet'''
+COLUMNS = {"ids": (np.int64, -1), "x": (np.float64, np.nan), "y": (np.float64, np.nan), "trajectory": (np.float64, 1.0),
+           "section": (np.int32, 0), "path_position": (np.float64, np.nan), "lateral_offset": (np.float64, 0.0),
+           "state": (np.int8, 0), "last_seen": (np.int64, -1)}
+
+class DropletStore():
+    def __init__(self, capacity: int = 64) -> None:
+        '''
+        Holds the fields of every droplet in preallocated numpy columns (see COLUMNS) indexed by slot, instead of a dict per Droplet object.
+        A Droplet is a thin view of its slot so the existing code can keep using drop.x, drop.current_section... while the hot loops read
+        and write whole columns at once. Which segment a droplet is in is the section column instead of a set in every segment,
+        near(section) gives the droplets the segment's queue used to hold.
+        The columns double when they run out and the slots of removed droplets are reused, so memory only grows with the most droplets
+        on the course at the same time and not with how many have passed through.
+        '''
+        for name, (dtype, default) in COLUMNS.items():
+            setattr(self, name, np.full(capacity, default, dtype=dtype))
+        self.views = np.empty(capacity, dtype=object)
+        self.slot_of = {}
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def __contains__(self, droplet_id) -> bool:
+        return droplet_id in self.slot_of
+
+    def __iter__(self):
+        '''Every droplet in the store in slot order'''
+        return iter(self.views[self.active_slots()].tolist())
+
+    def grow(self) -> None:
+        '''Doubles the number of slots'''
+        capacity = len(self.ids)
+        for name, (dtype, default) in COLUMNS.items():
+            setattr(self, name, np.concatenate((getattr(self, name), np.full(capacity, default, dtype=dtype))))
+        self.views = np.concatenate((self.views, np.empty(capacity, dtype=object)))
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def allocate(self, droplet_id, view) -> int:
+        '''Gives droplet_id a fresh slot with every column at its default and returns it. view is the Droplet that reads the slot'''
+        if droplet_id in self.slot_of:
+            raise ValueError(f"Droplet {droplet_id} is already in the store")
+        if not self.free:
+            self.grow()
+        slot = self.free.pop()
+        for name, (_, default) in COLUMNS.items():
+            getattr(self, name)[slot] = default
+        self.ids[slot] = droplet_id
+        self.views[slot] = view
+        self.slot_of[droplet_id] = slot
+        return slot
+
+    def add(self, droplet) -> None:
+        '''Moves a Droplet made with its own store (or from another store) in to this one, copying its row. Does nothing if it's already here'''
+        if droplet.store is self:
+            return
+        slot = self.allocate(droplet.id, droplet)
+        for name in COLUMNS:
+            getattr(self, name)[slot] = getattr(droplet.store, name)[droplet.slot]
+        droplet.store, droplet.slot = self, slot
+
+    def remove(self, droplet_id) -> None:
+        '''Frees a droplet's slot for the next droplet. The Droplet object is moved to a store of its own so it can still be read afterwards'''
+        slot = self.slot_of[droplet_id]
+        DropletStore(1).add(self.views[slot])
+        del self.slot_of[droplet_id]
+        self.ids[slot] = -1
+        self.views[slot] = None
+        self.free.append(slot)
+
+    def get(self, droplet_id):
+        '''The Droplet with droplet_id'''
+        return self.views[self.slot_of[droplet_id]]
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.ids != -1)
+
+    def slots(self, droplet_ids: list) -> np.ndarray:
+        '''The slot of every id in droplet_ids, to index the columns with'''
+        return np.array([self.slot_of[droplet_id] for droplet_id in droplet_ids], dtype=np.int64)
+
+    def points(self, slots: np.ndarray) -> np.ndarray:
+        '''The (x, y) of the droplets in slots as an (N, 2) array'''
+        return np.column_stack((self.x[slots], self.y[slots]))
+
+    def near(self, section: int) -> list:
+        '''Every droplet in section or the section before it, what used to be the segment's queue'''
+        slots = np.flatnonzero((self.ids != -1) & ((self.section == section) | (self.section == section - 1)))
+        return self.views[slots].tolist()
+
+def column(name: str, optional: bool = False, writable: bool = True) -> property:
+    '''A Droplet attribute that reads and writes the droplet's slot of a DropletStore column. optional columns read back None while
+    they hold NaN (not set yet) and setting them to None stores NaN'''
+    def get(view):
+        value = getattr(view.store, name)[view.slot].item()
+        if optional and value != value:
+            return None
+        return value
+
+    def set(view, value) -> None:
+        getattr(view.store, name)[view.slot] = np.nan if value is None else value
+    return property(get, set if writable else None)
@@ -0,0 +1,537 @@
+import cv2
+import supervision as sv
+import sys, os
+import argparse
+import importlib
+import logging
+from course_lookup import CourseLookup, build_course_lookup, OFF_COURSE
+from kalman_tracker import KalmanTracker
+from association import associate
+from arc_length import build_arc_length_table
+from centerline import build_centerline, Centerline
+from detection_cache import cache_path, file_hash, open_replay, DetectionRecorder
+from track_writer import TrackWriter
+from video_render import AsyncVideoWriter
+from frame_source import FrameReader
+from detection_stage import BatchedDetector, YoloBackend, detection_frames
+from motion_gate import MotionGate
+from blob_detector import BlobDetector
+from onnx_backend import OnnxBackend, export_onnx
+from pipeline import Pipeline
+from course_artifact import load_course
+from profiler import Profiler
+from droplet_store import DropletStore, column
+from droplet_lifecycle import DropletLifecycle
+from droplet_spawner import DispenserSpawner, ScheduledSpawner, read_dispensers, read_schedule
+
+logger = logging.getLogger("dropshop")
+
+'''The scripts that hold a course, its build_course, SCHEDULE, DISPENSERS and RESIZE, and a main that runs the tracker on it'''
+COURSE_MODULES = ("DropShop", "dropshop_IP")
+
+class Path():
+    def __init__(self) -> None:
+        '''The segments of the course in order and the DropletStore of every droplet on it'''
+        self.segments_in_order = []
+        self.droplets = DropletStore()
+    
+    def add_segment(self, new_segment) -> None:
+        '''Adds a segment of the course into the Paths array'''
+        self.segments_in_order.append(new_segment)
+
+    def add_droplet_to_queues(self, droplet) -> None:
+        '''Puts a droplet on the course by adding it to the course's DropletStore. The segments don't have queues anymore, the segment a droplet
+        is in is its current_section column and droplets_near gives what used to be in a segment's queue (its section and the one after it)'''
+        self.droplets.add(droplet)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Section %d queue %s", droplet.current_section, [drop.id for drop in self.droplets_near(droplet.current_section)])
+
+    def droplets_near(self, section: int) -> list:
+        '''Every droplet a detection in section could belong to, the ones in section and the section before it'''
+        return self.droplets.near(section)
+
+class Droplet():
+    __slots__ = ("store", "slot")
+    id = column("ids", writable=False)
+    x = column("x", optional=True)
+    y = column("y", optional=True)
+    trajectory = column("trajectory")
+    current_section = column("section")
+    path_position = column("path_position", optional=True) #How far along the whole course the droplet is, set once the motion model tracks it
+    lateral_offset = column("lateral_offset") #How far to the side of the course's centerline the droplet was last seen
+    state = column("state") #Where the droplet is in its lifecycle, see DropletLifecycle
+
+    def __init__(self, id, x: int = None, y:int = None, trajectory: int = 1, current_section: int = 0, store: DropletStore = None) -> None:
+        '''Initialize Droplet Object. The fields live in a slot of a DropletStore and the Droplet only reads and writes them, a droplet made
+        without a store gets one of its own until it's added to the course's'''
+        self.store = store if store is not None else DropletStore(1)
+        self.slot = self.store.allocate(id, self)
+        self.x = x
+        self.y = y
+        self.trajectory = trajectory
+        self.current_section = current_section
+
+class Straight():
+    def __init__(self, point1: (int, int), point2: (int, int), direction: int) -> None:
+        '''Initialize a straight Box and it's direction'''
+        self.top_left = point1
+        self.bottom_right = point2
+        self.direction = direction
+        #self.top_right = (460, 45) # Will have to be a passed in argument once Interface is integrated
+
+class Curve():
+    def __init__(self, point1: (int, int), point2: (int, int), direction: int) -> None:
+        '''Initialize a curve's box and it's direction. Assuming a start, middle, end point are provided.
+        The curve through them is kept as an arc length table (see build_arc_length_table)
+        '''
+        self.top_left = point1
+        self.bottom_right = point2
+        self.direction = direction 
+        self.start = None
+        self.mid = None
+        self.end = None
+        self.arc_table = None #Holds the curve sampled by distance travelled along it
+
+    def add_sme(self, s: (int, int), m: (int, int), e: (int, int)) -> None:
+        '''Adds the start middle end points and builds the curve's arc length table from them. There's no y = f(x) fit so curves whose
+        start, middle or end share an x (a vertical arm) work too'''
+        self.start = s
+        self.mid = m
+        self.end = e
+        self.arc_table = build_arc_length_table(s, m, e)
+
+def load_model(weights_path: str):
+    '''Loads the YOLO model. ultralytics is imported here instead of at the top because it's slow to import and replayed runs never need it'''
+    from ultralytics import YOLO
+    return YOLO(weights_path)
+
+def boxes_to_detections(boxes) -> sv.Detections:
+    '''Builds the supervision Detections used for drawing from a frame's (N, 7) detection rows, whether they came from the model or a replay'''
+    return sv.Detections(xyxy=boxes[:, :4].astype(float), confidence=boxes[:, 5].astype(float), class_id=boxes[:, 6].astype(int))
+
+def build_course_from_boxes(boxes: list) -> Path:
+    '''Builds the Path object from the bounding box interface's boxes (see read_course_boxes) instead of the hard coded course'''
+    course = Path()
+    for box in boxes:
+        if box[1] == "straight":
+            course.add_segment(Straight(box[3][0], box[3][1], box[2]))
+        else:
+            segment = Curve(box[3][0], box[3][1], box[2])
+            course.add_segment(segment)
+            segment.add_sme(box[5][0], box[4], box[5][1])
+    return course
+
+def build_course_from_compiled(compiled) -> Path:
+    '''Builds the Path object from a compiled course (see course_artifact) without sampling any curves, every Curve gets its arc length
+    table straight from the memory mapped arrays'''
+    course = Path()
+    for index, box in enumerate(compiled.boxes):
+        if box[1] == "straight":
+            course.add_segment(Straight(box[3][0], box[3][1], box[2]))
+        else:
+            segment = Curve(box[3][0], box[3][1], box[2])
+            course.add_segment(segment)
+            segment.start, segment.mid, segment.end = box[5][0], box[4], box[5][1]
+            segment.arc_table = compiled.curve(index)
+    return course
+
+def label_course(frame, course) -> None:
+    '''Draws bounding boxes on Curves for now this is assumed given. 
+    This function is just to be used to help visualize the backend can be removed.
+    '''
+    straight_rgb = (0, 255, 0)
+    curve_rgb = (255, 0, 0)
+    thick = 2
+    for segment in course.segments_in_order:
+        cv2.rectangle(frame, segment.top_left, segment.bottom_right, straight_rgb if isinstance(segment, Straight) else curve_rgb, thick)
+
+def label_curves_s_m_e(frame, course) -> None:
+    '''Draw the bounding Boxes for the curvers and their Start, Middle, End. 
+    Similarly Label Course this can be removed as well and is used
+    to label the start middle and end of curves'''
+    rgb = (0, 0, 200)
+    thick = 2
+    for segment in course.segments_in_order:
+        if isinstance(segment, Curve):
+            start_left, start_right = give_me_a_small_box(segment.start)
+            mid_left, mid_right = give_me_a_small_box(segment.mid)
+            end_left, end_right = give_me_a_small_box(segment.end)
+
+            cv2.rectangle(frame, start_left, start_right, rgb, thick)
+            cv2.rectangle(frame, mid_left, mid_right, rgb, thick)
+            cv2.rectangle(frame, end_left, end_right, rgb, thick)
+
+def where_droplets_should_start(frame, dispensers: [((int, int), (int, int))]) -> None:
+    '''Draws a bounding box in front of dispenser location'''
+    for top_left, bottom_right in dispensers:
+        cv2.rectangle(frame, top_left, bottom_right, (255, 0, 0), 2)
+    
+def get_mid_point(xone: int, yone: int, xtwo: int, ytwo: int) -> (int, int):
+    '''Take two corners and return the middle of the two points'''
+    return ((xone + xtwo)//2, (yone + ytwo)//2)
+
+def give_me_a_small_box(point: (int, int)) -> ((int, int), (int, int)):
+    '''Creates a small box for open CV to generate a bounding box a round a point'''
+    #Open CV doesn't support float objects
+    return (int(point[0] - 2), int(point[1] - 2)),(int(point[0] + 2), int(point[1] + 2))
+
+def box_drops(drops: {Droplet}, frame) -> None:
+    '''This boxs the Droplets I know about'''
+    for drop in drops:
+        left_predict, right_predict = give_me_a_small_box((drop.x, drop.y))
+        cv2.rectangle(frame, left_predict, right_predict, (100, 0, 0), 4)
+
+def register_droplets(drops: {Droplet}, motion: KalmanTracker, centerline: Centerline) -> None:
+    '''Starts tracking any droplet in drops the motion model doesn't know about yet. The droplet starts where it is on the course moving trajectory pixels a frame'''
+    for drop in drops:
+        if drop.id not in motion:
+            distances, lateral_offsets = centerline.project([(drop.x, drop.y)], [drop.current_section])
+            drop.path_position, drop.lateral_offset = float(distances[0]), float(lateral_offsets[0])
+            motion.add(drop.id, [drop.path_position], [drop.trajectory])
+
+def start_droplets(drops: [Droplet], course: Path, motion: KalmanTracker, centerline: Centerline, lifecycle: DropletLifecycle, t: int) -> None:
+    '''Puts the droplets a spawner started on frame t on the course, starts tracking them and counts them as spawned'''
+    for drop in drops:
+        course.add_droplet_to_queues(drop)
+    if drops:
+        register_droplets(course.droplets, motion, centerline)
+        lifecycle.spawn([drop.id for drop in drops], t)
+
+def sync_droplets(motion: KalmanTracker, centerline: Centerline, course: Path) -> None:
+    '''Copies the motion model's path positions back in to the course's DropletStore. The pixel positions and sections of every droplet are
+    looked up from the centerline and written straight in to the store's columns, no Droplet objects are touched'''
+    ids, distances = motion.positions()
+    distances = distances[:, 0]
+    store = course.droplets
+    slots = store.slots(ids.tolist())
+    points = centerline.to_pixels(distances, store.lateral_offset[slots])
+    store.path_position[slots] = distances
+    store.x[slots], store.y[slots] = points[:, 0], points[:, 1]
+    store.section[slots] = centerline.segment_of(distances)
+
+def load_mac_files():
+    '''Loads the proper files for Mac'''
+    model = load_model("runs/detect/train10/weights/best.pt")
+    video_cap = cv2.VideoCapture("droplet_videos/video_data_Rainbow 11-11-22.m4v")
+    return model, video_cap 
+
+def main(weights_path, video_path, cache_dir: str = "detection_cache", headless: bool = False, tracks_path: str = None,
+         render_path: str = None, render_every: int = 1, batch_size: int = 1, max_latency: float = 0.05,
+         crop_to_course: bool = False, motion_gate: bool = False, max_skips: int = 10,
+         detector_backend: str = "yolo", runtime: str = "torch", threads: int = None, workers: int = 0,
+         course_path: str = None, backend=None, profile: bool = False, frame_budget: float = None, trace_path: str = None,
+         dispensers_path: str = None, schedule_path: str = None, build_course=None, schedule: [dict] = None,
+         dispensers: [((int, int), (int, int))] = None, resize: (int, int) = None) -> dict:
+    '''Initializes all the variables the set of all droplets to help check for the missing droplets. The course that holds all the segments on Straights and Curves
+    course_lookup is the compiled course, a label image that maps all x,y points in side of each segment to that particular segment. Allows for looking up Droplets in that section
+    speed_threshold prevents detection from increasing average speed to beyond a reasonable speed.
+    max_jump_distance is the furthest in pixels a detection can be from a droplet's prediction and still be matched to it.
+    centerline is the course compiled into one continuous path, droplets are tracked by how far along it they are.
+    motion is the Kalman motion model that predicts and updates every droplet's path position and speed in one batched step per frame.
+    lifecycle retires droplets once they reach the end of the course or haven't been detected for lost_after frames, so they stop costing
+    anything every frame. The summary counts how many exited and how many were lost.
+
+    Detections are cached in cache_dir keyed by the video, the weights and the inference settings. The first run records every frame's detections
+    and later runs replay them without loading YOLO at all, which is what you want when only changing the tracker. Pass cache_dir=None to always run the model.
+
+    headless skips the window and all of the drawing so it can run on machines without a display. tracks_path writes every droplet's position on
+    every frame to a file (csv, ndjson or parquet from the extension, see TrackWriter). render_path writes the annotated frames to a video on a background thread, only every render_every frames are drawn.
+    When headless and replaying detections without rendering the video frames are never decoded at all.
+    Otherwise frames are decoded and resized ahead of time on a background thread by the FrameReader.
+
+    With a batch_size over 1 YOLO runs on batch_size frames at once (waiting at most max_latency seconds for a batch to fill) instead of
+    one frame at a time. Bytetrack is left out then since it has to see frames in order, the ids come from the tracker's own association anyway.
+
+    crop_to_course only runs YOLO on the rectangle around the course (plus roi_margin pixels so droplets on the edge aren't cut off) instead of
+    the whole frame. Less pixels per inference and no detections from outside the course to throw away. Boxes are moved back to frame coordinates.
+
+    motion_gate skips YOLO on frames where nothing on the course changed since the last detected frame and lets the predictions carry them,
+    at most max_skips frames in a row. The fraction of frames skipped is printed at the end.
+
+    detector_backend picks what finds the droplets, "yolo" for the model or "blob" for the BlobDetector which uses background subtraction inside
+    the course and runs much faster on machines without a GPU. The blob detector doesn't use the weights, batching or cropping.
+
+    runtime is what YOLO runs on, "torch" for ultralytics or "onnx" for ONNX Runtime. The onnx runtime exports the weights once (kept next to
+    them) and never imports PyTorch after that, threads is how many CPU threads one inference can use. It has no bytetrack so it's always batched.
+
+    workers over 0 runs the Pipeline instead, decoding in one process and detecting in workers processes while this one tracks, with frames
+    passed through shared memory. Each worker loads its own model so there's no bytetrack, motion gate or batching. How busy every stage was and
+    how full the queues got is printed at the end to see which stage is holding the others up.
+
+    course_path is a course saved by the bounding box interface, without one the hard coded build_course is used. The course is compiled
+    once to a .course file next to it (see course_artifact) and memory mapped from then on, it's recompiled when the course file changes.
+    backend is an already loaded YoloBackend or OnnxBackend to detect with (batched, no bytetrack) so running many videos doesn't load the
+    model for each one.
+
+    profile times every stage (decode, detect, spawning, prediction, association, writing, drawing...) and prints each one's p50/p95/p99 at
+    the end along with how many frames took longer than frame_budget milliseconds (the video's frame interval by default, so the frames that
+    couldn't keep up with real time). trace_path also saves every stage as a Chrome trace to open in chrome://tracing or Perfetto.
+    In pipeline mode decoding and detection happen in other processes so only the tracking stages are timed here.
+
+    dispensers_path is a JSON file of the rectangles in front of the dispensers (see read_dispensers). With one a new droplet is started whenever
+    a detection no droplet was matched to shows up inside a dispenser, so any video can be tracked without writing a schedule for it first.
+    Otherwise droplets are started on the frames in schedule_path (see read_schedule), or schedule without one, the same every run.
+
+    The rest is what differs between courses and comes from the course's script (DropShop.py, dropshop_IP.py): build_course builds the
+    hard coded Path used without a course_path, schedule is its built in spawn schedule, dispensers are the rectangles in front of its
+    dispensers that where_droplets_should_start draws and resize is the (width, height) every frame is resized to, None keeps the video's size.
+    Returns a summary of the run, or None if the video couldn't be opened.
+    '''
+    box = sv.BoxAnnotator(text_scale=0.3)
+    speed_threshold = 5
+    max_jump_distance = 40
+    motion = KalmanTracker(dim=1, max_speed=speed_threshold)
+    lost_after = 90
+    roi_margin = 16
+    # model, video_cap = load_mac_files()
+    video_cap = cv2.VideoCapture(video_path)
+
+    if not video_cap.isOpened():
+        logger.error("Video file %s could not be opened", video_path)
+        return
+
+    frame_size = resize or (int(video_cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    frame_interval = 1000 / (video_cap.get(cv2.CAP_PROP_FPS) or 30)
+    if course_path:
+        compiled = load_course(course_path, frame_size, build_course_from_boxes)
+        course = build_course_from_compiled(compiled)
+        course_lookup = CourseLookup(compiled.label_image, course.segments_in_order)
+        centerline = compiled.centerline
+    else:
+        course = build_course()
+        course_lookup = build_course_lookup(course)
+        centerline = build_centerline(course)
+    all_droplets = course.droplets
+    lifecycle = DropletLifecycle(all_droplets, motion, centerline.length, lost_after)
+    if dispensers_path:
+        spawner = DispenserSpawner(read_dispensers(dispensers_path), Droplet, max_jump=max_jump_distance)
+    else:
+        spawner = ScheduledSpawner(read_schedule(schedule_path) if schedule_path else schedule, Droplet)
+    blob = detector_backend == "blob"
+    roi = course_lookup.bounds(roi_margin, frame_size) if crop_to_course and not blob else None
+    staged = workers > 0 and not blob and not backend
+    gate = MotionGate(course_lookup, max_skips=max_skips) if motion_gate and not staged else None
+    onnx = runtime == "onnx" and not blob
+    batched = (batch_size > 1 or onnx or staged or backend) and not blob
+    track_settings = {"tracker": "bytetrack.yaml", "persist": True}
+    if blob:
+        settings = {"detector": "blob", "resize": resize}
+    else:
+        settings = {"tracker": None if batched else "bytetrack.yaml", "persist": not batched, "resize": resize}
+    if onnx:
+        settings["runtime"] = "onnx"
+    if roi:
+        settings["roi"] = roi
+    if gate:
+        settings["motion_gate"] = (gate.pixel_threshold, gate.changed_fraction, gate.max_skips)
+    if course_path and (blob or gate):
+        settings["course"] = file_hash(course_path)
+    detection_file = cache_path(cache_dir, video_path, None if blob else weights_path, settings) if cache_dir else None
+    replay = open_replay(detection_file) if detection_file else None
+    recorder = DetectionRecorder(os.path.basename(detection_file)) if detection_file and not replay else None
+    model = None if replay or blob or onnx or staged or backend else load_model(weights_path)
+    detector = BatchedDetector(YoloBackend(model), batch_size, max_latency, roi) if model and batched else None
+    if onnx and not replay and not staged and not backend:
+        detector = BatchedDetector(OnnxBackend(export_onnx(weights_path), threads), batch_size, max_latency, roi)
+    if backend and not replay and not blob:
+        detector = BatchedDetector(backend, batch_size, max_latency, roi)
+    if blob and not replay:
+        detector = BlobDetector(course_lookup.mask() if course_path else build_course_lookup(course, frame_size).mask())
+
+    tracks = TrackWriter(tracks_path) if tracks_path else None
+    render = AsyncVideoWriter(render_path, (video_cap.get(cv2.CAP_PROP_FPS) or 30) / render_every) if render_path else None
+    profiler = Profiler(profile or bool(trace_path), frame_budget or frame_interval, trace=bool(trace_path))
+    stages = Pipeline(video_path, weights_path, frame_size, resize=resize, runtime=runtime, threads=threads, roi=roi,
+                      workers=workers) if staged and not replay else None
+    decode_frames = not (headless and replay and not render) and not stages
+    reader = FrameReader(video_cap, resize=resize, capacity=max(8, batch_size + 2)) if decode_frames else None
+    if stages:
+        video_cap.release()
+        frames = stages.frames(recorder)
+        if render:
+            stages.queues["track -> render"] = render.queue
+    else:
+        frames = detection_frames(reader, replay, model, detector, recorder, track_settings, roi, gate, profiler)
+
+    '''Initializes Time t to help debug on specific frames or time intervals of the video.'''    
+    t = 0
+    # while t < 500: 
+    '''Frame is None when the detections are replayed without decoding the video'''
+    for frame, boxes in frames:
+        t += 1 #Increment the time
+        profiler.start_frame()
+
+        draw = (not headless or render) and t % render_every == 0
+
+        if t > 0:
+            logger.debug("Frame %d", t)
+            '''The spawner starts the droplets scheduled for this frame.
+            Result holds the model's detections. Observed pairs every matched droplet with its detection and confidences holds their confidences for the tracks file
+            Labels is to generate the strings/text for the bounding boxes of the detections
+            '''
+            start_droplets(spawner.spawn(t), course, motion, centerline, lifecycle, t)
+            profiler.lap("spawn")
+
+            '''Predict where every droplet is this frame before matching them with the detections'''
+            motion.predict()
+            sync_droplets(motion, centerline, course)
+            profiler.lap("predict")
+
+            observed = []
+            confidences = {}
+            labels = []
+            
+            try:
+                '''Data is from the models detection in the formate of top left point, bottom right point, __, confidence, class from the data set
+                mid is the middle point of two points. used in this case for the top left and bottom right point of each detection
+                '''
+                rows = boxes.tolist()
+                mids = [get_mid_point(data[0], data[1], data[2], data[3]) for data in rows]
+                segment_indices = course_lookup.segment_indices(mids)
+
+                '''Associate matches every detection with a droplet in one assignment so no two detections claim the same droplet.
+                A detection is only considered for the droplets whose section or next section it is in, and no further than max_jump_distance away.
+                A segment index of OFF_COURSE is when a detection happens outside of the Course in space that should not be considered.
+                It is never matched and the false detection is flagged. Should be a True False occurrence
+                '''
+                slots = all_droplets.active_slots()
+                drops = all_droplets.views[slots]
+                matches, unmatched_detections, _ = associate(mids, segment_indices, all_droplets.points(slots), all_droplets.section[slots], max_jump_distance)
+                for detection in unmatched_detections:
+                    if segment_indices[detection] == OFF_COURSE:
+                        logger.debug("Detection occurred outside of the course. Data: %s", rows[detection])
+
+                for detection, drop in matches:
+                    '''The confidence is second to last whether or not the tracker gave the detection an id'''
+                    confidence = rows[detection][-2]
+                    closest_droplet = drops[drop]
+
+                    '''Observed detections are corrected all at once by the motion model after every detection is matched'''
+                    observed.append((closest_droplet, detection))
+                    confidences[closest_droplet.id] = confidence
+
+                    if confidence:
+                        labels.append(f"{closest_droplet.id} {confidence:0.2f}")
+                profiler.lap("associate")
+
+                '''The detections are put on the course's centerline and the motion model is corrected with how far along the course they were seen.
+                Sections are then updated from the path positions for every droplet, seen or not, so there's no bounding box checks or missing droplet cases'''
+                observed_detections = [detection for _, detection in observed]
+                distances, lateral_offsets = centerline.project([mids[detection] for detection in observed_detections], segment_indices[observed_detections])
+                observed_ids = [drop.id for drop, _ in observed]
+                motion.update(observed_ids, distances)
+                for (closest_droplet, _), lateral_offset in zip(observed, lateral_offsets.tolist()):
+                    closest_droplet.lateral_offset = lateral_offset
+                sync_droplets(motion, centerline, course)
+
+                '''Detections nothing was matched to that are in front of a dispenser are new droplets'''
+                live_points = all_droplets.points(all_droplets.active_slots())
+                start_droplets(spawner.spawn_from(t, mids, segment_indices, unmatched_detections, live_points), course, motion, centerline, lifecycle, t)
+                lifecycle.observe(observed_ids, t)
+                retiring = lifecycle.step(t)
+                profiler.lap("update")
+
+                '''Droplets that exited or were lost get their last row written with that state before they're retired'''
+                if tracks:
+                    tracks.write_frame(t, all_droplets, (t - 1) * frame_interval, confidences)
+                    profiler.lap("write")
+                for drop in lifecycle.retire(retiring):
+                    logger.debug("Droplet %d retired", drop.id)
+
+                '''The remainder of the code is the labeling and drawing of the map on the frame'''
+                if draw:
+                    box_drops(all_droplets, frame)
+
+            except Exception:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+                logger.warning("%s in %s line %d", exc_type.__name__, fname, exc_tb.tb_lineno)
+
+        # where_droplets_should_start(frame, dispensers)  #Call to show dispenser locations
+
+        if not draw:
+            continue
+
+        detections = boxes_to_detections(boxes)
+        label_course(frame, course) 
+        label_curves_s_m_e(frame, course)
+
+        frame = box.annotate(scene=frame, detections=detections, labels = labels)
+        profiler.lap("draw")
+        if render:
+            render.write(frame.copy())
+            profiler.lap("render")
+        if headless:
+            continue
+
+        cv2.imshow("yolov8", frame)
+
+        if (cv2.waitKey(10) == 27):
+            break
+        profiler.lap("display")
+    else:
+        logger.info("Video ended")
+        if recorder:
+            recorder.save(detection_file)
+
+    profiler.end_frame()
+    if reader:
+        reader.close()
+    else:
+        video_cap.release()
+    if tracks:
+        tracks.close()
+    if render:
+        render.close()
+    if stages:
+        stages.close()
+        stages.report()
+    if gate and not replay:
+        print(f"Skipped detection on {gate.skip_ratio():.1%} of frames")
+    profiler.report()
+    if trace_path:
+        profiler.write_trace(trace_path)
+    return {"video": video_path, "frames": t, "droplets": lifecycle.spawned, "exited": lifecycle.retired["exited"], "lost": lifecycle.retired["lost"],
+            "replayed": bool(replay)}
+
+def parse_args(weights_path: str, video_path: str, argv: list = None) -> argparse.Namespace:
+    '''Command line options for running the tracker, weights_path and video_path are the defaults, the files a course's script has been tested with'''
+    parser = argparse.ArgumentParser(description="Track droplets on the DropShop course")
+    parser.add_argument("--weights", default=weights_path, help="YOLO weights file")
+    parser.add_argument("--video", default=video_path, help="Video to track droplets in")
+    parser.add_argument("--cache-dir", default="detection_cache", help="Where detections are cached, an empty string always runs the model")
+    parser.add_argument("--headless", action="store_true", help="Don't open a window or draw anything, for machines without a display")
+    parser.add_argument("--tracks", help="Write every droplet's position on every frame to this file")
+    parser.add_argument("--render", help="Write the annotated frames to this video file")
+    parser.add_argument("--render-every", type=int, default=1, help="Only draw every Nth frame")
+    parser.add_argument("--batch-size", type=int, default=1, help="Run YOLO on this many frames at once instead of tracking one frame at a time")
+    parser.add_argument("--max-latency", type=float, default=0.05, help="Longest time in seconds to wait for a batch to fill up")
+    parser.add_argument("--crop-to-course", action="store_true", help="Only run YOLO on the part of the frame the course is in")
+    parser.add_argument("--motion-gate", action="store_true", help="Skip YOLO on frames where nothing on the course changed")
+    parser.add_argument("--max-skips", type=int, default=10, help="Most frames in a row the motion gate can skip")
+    parser.add_argument("--detector", choices=("yolo", "blob"), default="yolo", help="Find droplets with YOLO or with background subtraction")
+    parser.add_argument("--runtime", choices=("torch", "onnx"), default="torch", help="Run YOLO with PyTorch or with ONNX Runtime on the CPU")
+    parser.add_argument("--threads", type=int, help="CPU threads one ONNX Runtime inference can use")
+    parser.add_argument("--workers", type=int, default=0, help="Decode and detect in separate processes with this many detection workers")
+    parser.add_argument("--course", help="Course file saved by the bounding box interface, the hard coded course is used without one")
+    parser.add_argument("--profile", action="store_true", help="Time every stage and print their latencies at the end")
+    parser.add_argument("--frame-budget", type=float, help="Milliseconds a frame can take before it's counted as over budget, the video's frame interval by default")
+    parser.add_argument("--trace", help="Save a Chrome trace of every stage to this JSON file, implies --profile")
+    parser.add_argument("--dispensers", help="JSON file of the rectangles in front of the dispensers, droplets are started automatically from them")
+    parser.add_argument("--schedule", help="JSON file of the frame every droplet starts on and where, the built in schedule is used without one")
+    parser.add_argument("--log-level", default="warning", choices=("debug", "info", "warning", "error"), help="debug logs every frame")
+    return parser.parse_args(argv)
+
+def main_options(args: argparse.Namespace) -> dict:
+    '''The keyword arguments of main for the command line options parse_args read'''
+    return {"cache_dir": args.cache_dir or None, "headless": args.headless, "tracks_path": args.tracks, "render_path": args.render,
+            "render_every": args.render_every, "batch_size": args.batch_size, "max_latency": args.max_latency,
+            "crop_to_course": args.crop_to_course, "motion_gate": args.motion_gate, "max_skips": args.max_skips,
+            "detector_backend": args.detector, "runtime": args.runtime, "threads": args.threads, "workers": args.workers,
+            "course_path": args.course, "profile": args.profile, "frame_budget": args.frame_budget, "trace_path": args.trace,
+            "dispensers_path": args.dispensers, "schedule_path": args.schedule}
+
+def course_main(course_module: str):
+    '''The main of the course script named course_module (one of COURSE_MODULES), so other scripts can run the tracker on any course.
+    Imported when it's asked for since the course scripts import this module'''
+    return importlib.import_module(course_module).main
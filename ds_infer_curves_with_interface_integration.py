@@ -3,6 +3,12 @@ from ultralytics import YOLO
 import supervision as sv
 import sys, os
 import math
+import logging
+from course_lookup import build_course_lookup
+from association import associate
+from frame_source import FrameReader
+
+logger = logging.getLogger("dropshop")
 
 
 class Path():
@@ -21,7 +27,8 @@ class Path():
         if length > 1 and droplet.current_section + 1 < length:
             self.segments_in_order[droplet.current_section + 1].add_droplet(droplet)
         self.segments_in_order[droplet.current_section].add_droplet(droplet)
-        print([drop.id for drop in self.segments_in_order[droplet.current_section].queue])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Section %d queue %s", droplet.current_section, [drop.id for drop in self.segments_in_order[droplet.current_section].queue])
 
 class Droplet():
     def __init__(self, id, x: int = None, y:int = None, trajectory: int = 1, current_section: int = 0) -> None:
@@ -60,10 +67,10 @@ class Droplet():
                 try:
                     self.x += (self.curve_speed * direction_x)
                 except AttributeError:
-                    print("Occured o nself.x")
+                    logger.debug("Occured o nself.x")
                 self.y = segment.predict_y(self.x)
             except AttributeError:
-                print("Occurred here")
+                logger.debug("Occurred here")
         return (self.x, self.y)
     
     def update_section(self, course: Path, droplet) -> None:
@@ -82,7 +89,7 @@ class Droplet():
                 if self.current_section + 1 < len(course.segments_in_order):
                     course.segments_in_order[self.current_section + 1].add_droplet(droplet)
     
-    def update_last_seen(self, mid : (int, int), t : int, x_y_map: {(int, int): Path}) -> None:
+    def update_last_seen(self, mid : (int, int), t : int, segment) -> None:
         '''In Progress 11/13/2023 1:07 AM Something with this is breaking occassionally will have to see what
         This function initially intended to calculate trajectory over averages if a Droplet was detected. This then updates over
         the difference between its last difference in straights. The trajectory for curves needs to be decided still.
@@ -93,7 +100,7 @@ class Droplet():
             self.last_detection = (mid, t)
             return
         else:
-            if isinstance(x_y_map[mid], Straight):
+            if isinstance(segment, Straight):
                 last_x, curr_x, last_t = self.last_detection[0][0], mid[0], self.last_detection[1]
                 new_trajectory =  max((last_x - curr_x), (curr_x - last_x))//max((last_t - t), (t - last_t))
                 if new_trajectory:
@@ -221,17 +228,6 @@ def build_course(bound_list) -> Path:
     # course.add_segment(straight3)
     return course
 
-def build_x_y_map(course: Path) -> {(int, int): Path}:
-    '''Builds a python dictionary that stores every (x, y) coordinate inside a bounding box to map it to a specific queue so we can later check that queue with each detection'''
-    ret_dic = {}
-    for course in course.segments_in_order:
-        x1, y1 = course.top_left
-        x2, y2 = course.bottom_right
-        for i in range(x1, x2 + 1): 
-            for j in range(y1, y2 + 1):
-                ret_dic[(i, j)] = course
-    return ret_dic
-
 def get_distance(point1: (int, int), point2: (int, int)) -> float:
     '''Distance formula between two points'''
     x1, y1 = point1
@@ -308,20 +304,6 @@ def get_droplets_on_screen(t : int, num_droplets: int, drops:{Droplet}, course)
     else:
         return num_droplets
 
-def find_closest_droplet(drops_to_consider: {Droplet}, mid:(int, int), found: set) -> Droplet:
-    '''Find the closest droplet to a given (x, y) coordinate provided from a detection. If the droplet was associated already in this round
-    skip to save computations'''
-    closest = float('inf')
-    closest_drop = None
-    for drop in drops_to_consider.difference(found):
-        drop_point = (drop.x, drop.y)
-        distance = get_distance(drop_point, mid) 
-        if distance < closest:
-            closest_drop = drop
-            closest = distance
-    return closest_drop  
-
-
 def box_drops(drops: {Droplet}, frame) -> None:
     '''This boxs the Droplets I know about'''
     for drop in drops:
@@ -356,17 +338,18 @@ def main(bound_box_list):
 
 
     course = build_course(bound_box_list) # TODO fix
-    x_y_map = build_x_y_map(course)
+    course_lookup = build_course_lookup(course)
     box = sv.BoxAnnotator(text_scale=0.3)
+    max_jump_distance = 40
+    reader = FrameReader(video_cap, resize=(640, 480)) # default frame size, reduce bounding boxes to match
     
     t = 0
     droplets_on_screen = 0
     while t < 350: 
             t += 1
 
-            ret, frame = video_cap.read()
-            frame = cv2.resize(frame, (640, 480)) # default frame size, reduce bounding boxes to match
-
+            packet = reader.next()
+            ret, frame = packet is not None, packet.frame if packet else None
 
             if not ret:
                 print("Video ended")
@@ -379,32 +362,38 @@ def main(bound_box_list):
                 found = set()
                 labels = []
                 try:
-                    for data in result.boxes.data.tolist():
-                        xone, yone, xtwo, ytwo, _, confidence, _ = data
-                        mid = get_mid_point(xone, yone, xtwo, ytwo)
-                        drops_to_consider = x_y_map[mid].queue
-                        closest_droplet = find_closest_droplet(drops_to_consider, mid, found)
+                    rows = result.boxes.data.tolist()
+                    mids = [get_mid_point(data[0], data[1], data[2], data[3]) for data in rows]
+                    segment_indices = course_lookup.segment_indices(mids)
+                    drops = list(all_droplets)
+                    matches, _, _ = associate(mids, segment_indices, [(drop.x, drop.y) for drop in drops],
+                                              [drop.current_section for drop in drops], max_jump_distance)
+                    for detection, drop in matches:
+                        confidence = rows[detection][-2]
+                        mid = mids[detection]
+                        segment = course_lookup.segments[segment_indices[detection]]
+                        closest_droplet = drops[drop]
                         numbers_detected += 1
                         found.add(closest_droplet)
 
-                        closest_droplet.update_last_seen(mid, t, x_y_map)
+                        closest_droplet.update_last_seen(mid, t, segment)
                         # closest_droplet.update_position(course)
 
-                        if x_y_map[mid] != course.segments_in_order[closest_droplet.current_section]:
+                        if segment != course.segments_in_order[closest_droplet.current_section]:
                             closest_droplet.update_section(course, closest_droplet)
-                        
-                        box_drops(all_droplets, frame)
 
                         if confidence:
                             labels.append(f"{closest_droplet.id} {confidence:0.2f}")
 
+                    box_drops(all_droplets, frame)
+
                     if numbers_detected < droplets_on_screen:
                         handle_missings(all_droplets, found, course)
 
                 except Exception as e:
                     exc_type, exc_obj, exc_tb = sys.exc_info()
                     fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                    print(exc_type, fname, exc_tb.tb_lineno)
+                    logger.warning("%s in %s line %d", exc_type.__name__, fname, exc_tb.tb_lineno)
 
             detections = sv.Detections.from_ultralytics(result)
             label_course(frame, bound_box_list)
@@ -416,3 +405,5 @@ def main(bound_box_list):
             if (cv2.waitKey(10) == 27):
                 break
 
+    reader.close()
+
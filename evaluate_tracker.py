@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from droplet_tracker import COURSE_MODULES, course_main
+from track_writer import read_tracks
+
+GATED = 1e9
+
+def match_frame(truth: list, tracked: list, previous: {int: int}, max_distance: float) -> [(int, int, float)]:
+    '''
+    Matches one frame's ground truth droplets to the tracked droplets, both lists of (id, x, y). A ground truth droplet keeps the tracked
+    droplet it was matched to last time (previous maps ground truth ids to tracked ids) as long as it's still within max_distance pixels,
+    everything else is matched with one Hungarian solve on distance. Returns (truth index, tracked index, distance) for every match.
+    '''
+    if not truth or not tracked:
+        return []
+    truth_points = np.array([(x, y) for _, x, y in truth], dtype=float)
+    tracked_points = np.array([(x, y) for _, x, y in tracked], dtype=float)
+    distances = np.linalg.norm(truth_points[:, None, :] - tracked_points[None, :, :], axis=2)
+    tracked_index = {droplet_id: j for j, (droplet_id, _, _) in enumerate(tracked)}
+
+    matches = []
+    used = set()
+    for i, (truth_id, _, _) in enumerate(truth):
+        j = tracked_index.get(previous.get(truth_id))
+        if j is not None and j not in used and distances[i, j] <= max_distance:
+            matches.append((i, j, float(distances[i, j])))
+            used.add(j)
+
+    kept = {i for i, _, _ in matches}
+    rows = [i for i in range(len(truth)) if i not in kept]
+    cols = [j for j in range(len(tracked)) if j not in used]
+    if rows and cols:
+        cost = distances[np.ix_(rows, cols)]
+        cost[cost > max_distance] = GATED
+        for row, col in zip(*linear_sum_assignment(cost)):
+            if cost[row, col] < GATED:
+                matches.append((rows[row], cols[col], float(cost[row, col])))
+    return matches
+
+def evaluate(truth: dict, tracks: dict, max_distance: float = 10.0) -> dict:
+    '''
+    CLEAR MOT metrics of tracks against truth, both {frame: [(id, x, y), ...]} from read_tracks. Only the frames from the first to the last
+    frame of the ground truth count, so a partly annotated video can be used.
+    A ground truth droplet with no tracked droplet within max_distance pixels is lost that frame (a miss), a tracked droplet with no ground
+    truth droplet is a false positive and a ground truth droplet matched to a different tracked id than the last time it was matched is an id switch.
+    MOTA is 1 - (misses + false positives + id switches) / ground truth droplets, MOTP is the mean distance of the matches in pixels.
+    '''
+    if not truth:
+        raise ValueError("The ground truth file has no tracks")
+    previous = {}
+    lost_by_id = {}
+    total = matched = false_positives = id_switches = 0
+    distance_sum = 0.0
+    for frame in range(min(truth), max(truth) + 1):
+        frame_truth, frame_tracks = truth.get(frame, []), tracks.get(frame, [])
+        matches = match_frame(frame_truth, frame_tracks, previous, max_distance)
+        total += len(frame_truth)
+        matched += len(matches)
+        false_positives += len(frame_tracks) - len(matches)
+        matched_truth = set()
+        for i, j, distance in matches:
+            truth_id, tracked_id = frame_truth[i][0], frame_tracks[j][0]
+            if truth_id in previous and previous[truth_id] != tracked_id:
+                id_switches += 1
+            previous[truth_id] = tracked_id
+            matched_truth.add(i)
+            distance_sum += distance
+        for i, (truth_id, _, _) in enumerate(frame_truth):
+            if i not in matched_truth:
+                lost_by_id[truth_id] = lost_by_id.get(truth_id, 0) + 1
+
+    misses = total - matched
+    return {"frames": max(truth) - min(truth) + 1, "truth": total, "matched": matched, "lost": misses, "false_positives": false_positives,
+            "id_switches": id_switches, "mota": 1 - (misses + false_positives + id_switches) / total if total else 0.0,
+            "motp": distance_sum / matched if matched else 0.0, "lost_by_id": {str(droplet_id): lost for droplet_id, lost in sorted(lost_by_id.items())}}
+
+def run_tracker(weights_path: str, video_path: str, tracks_path: str, cache_dir: str = "detection_cache", course_module: str = "DropShop",
+                **options) -> dict:
+    '''Runs the course script course_module (DropShop or dropshop_IP) headless writing its tracks to tracks_path and returns its summary with
+    how long it took and the frames per second. With a cache_dir the recorded detections are replayed when there are some, without one the
+    model runs on every frame'''
+    start_time = time.perf_counter()
+    summary = course_main(course_module)(weights_path, video_path, cache_dir=cache_dir, headless=True, tracks_path=tracks_path, **options)
+    if summary is None:
+        raise ValueError(f"Video file {video_path} could not be opened")
+    summary["seconds"] = time.perf_counter() - start_time
+    summary["fps"] = summary["frames"] / summary["seconds"] if summary["seconds"] else 0.0
+    return summary
+
+def compare(result: dict, baseline_path: str, tolerance: float = 0.0) -> bool:
+    '''Prints the change in every metric since an earlier results file. Returns False if the tracking got worse, MOTA dropping by more than
+    tolerance or more id switches. Frames per second are only printed, they depend too much on what else the machine is doing to fail on'''
+    with open(baseline_path, 'r') as file:
+        baseline = json.load(file)
+    print(f"\n{'metric':<16}{'baseline':>12}{'now':>12}")
+    for name in ("mota", "motp", "id_switches", "lost", "false_positives", "fps"):
+        before, after = baseline.get(name), result.get(name)
+        if before is not None and after is not None:
+            print(f"{name:<16}{before:>12.3f}{after:>12.3f}")
+    regressed = result["mota"] < baseline["mota"] - tolerance or result["id_switches"] > baseline["id_switches"]
+    if regressed:
+        print("Tracking accuracy regressed")
+    return not regressed
+
+def main(truth_path: str, weights_path: str = None, video_path: str = None, tracks_path: str = None, cache_dir: str = "detection_cache",
+         max_distance: float = 10.0, output_path: str = None, baseline_path: str = None, tolerance: float = 0.0, course_module: str = "DropShop",
+         **options) -> bool:
+    '''
+    Measures how well the tracker follows the droplets in a ground truth track file (the same columns as the --tracks files, frames counted
+    from 1) and how fast it runs, so a speed up can be checked to not cost any accuracy. The tracker is run headless on video_path, from the
+    recorded detections in cache_dir when the video has been run before (only the tracker is timed then) or with the model on every frame
+    when cache_dir is None. tracks_path evaluates an existing tracks file instead of running anything. course_module is the course script
+    whose main is run (its course, schedule, dispensers and frame size are used) and options are passed on to it.
+    The metrics are printed and saved to output_path as JSON. Returns False if they regressed compared to the baseline_path results file.
+    '''
+    truth = read_tracks(truth_path)
+    if tracks_path:
+        summary = {}
+        tracks = read_tracks(tracks_path)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            written = os.path.join(directory, "tracks.csv")
+            summary = run_tracker(weights_path, video_path, written, cache_dir, course_module, **options)
+            tracks = read_tracks(written)
+
+    result = evaluate(truth, tracks, max_distance)
+    for name in ("video", "replayed", "seconds", "fps"):
+        if name in summary:
+            result[name] = summary[name]
+    print(f"MOTA {result['mota']:.3f}  MOTP {result['motp']:.2f} px  id switches {result['id_switches']}  "
+          f"lost {result['lost']} of {result['truth']}  false positives {result['false_positives']}")
+    if "fps" in result:
+        print(f"{summary['frames']} frames in {result['seconds']:.2f} s, {result['fps']:.1f} fps"
+              f"{' from recorded detections' if result['replayed'] else ' with live inference'}")
+    if output_path:
+        with open(output_path, 'w') as file:
+            json.dump(result, file, indent=2)
+    return compare(result, baseline_path, tolerance) if baseline_path else True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score the tracker's ids and speed against a ground truth track file")
+    parser.add_argument("truth", help="Ground truth tracks, a csv, ndjson or parquet file with frame, id, x and y columns")
+    parser.add_argument("--video", help="Video to run the tracker on")
+    parser.add_argument("--weights", default="runs/detect/train10/weights/best.pt", help="YOLO weights file")
+    parser.add_argument("--tracks", help="Score an existing tracks file instead of running the tracker")
+    parser.add_argument("--cache-dir", default="detection_cache", help="Where recorded detections are replayed from")
+    parser.add_argument("--live", action="store_true", help="Run the model on every frame instead of replaying recorded detections")
+    parser.add_argument("--course", help="Course file saved by the bounding box interface, the hard coded course is used without one")
+    parser.add_argument("--course-module", choices=COURSE_MODULES, default="DropShop", help="Course script whose course, schedule and dispensers are used")
+    parser.add_argument("--detector", choices=("yolo", "blob"), default="yolo", help="Find droplets with YOLO or with background subtraction")
+    parser.add_argument("--runtime", choices=("torch", "onnx"), default="torch", help="Run YOLO with PyTorch or with ONNX Runtime on the CPU")
+    parser.add_argument("--max-distance", type=float, default=10.0, help="Furthest in pixels a tracked droplet can be from a ground truth one and still match")
+    parser.add_argument("--output", help="Save the metrics to this JSON file")
+    parser.add_argument("--baseline", help="Metrics saved by an earlier run, exits with 1 if tracking got worse")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="How much MOTA can drop before it counts as worse")
+    args = parser.parse_args()
+    if not args.tracks and not args.video:
+        parser.error("either --video or --tracks is needed")
+    passed = main(args.truth, args.weights, args.video, args.tracks, None if args.live else args.cache_dir or None, args.max_distance,
+                  args.output, args.baseline, args.tolerance, args.course_module, course_path=args.course, detector_backend=args.detector, runtime=args.runtime)
+    sys.exit(0 if passed else 1)
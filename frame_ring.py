@@ -0,0 +1,88 @@
+import queue
+from multiprocessing import shared_memory
+import numpy as np
+
+class FrameRing():
+    def __init__(self, capacity: int, frame_size: (int, int), context=None) -> None:
+        '''
+        A fixed pool of capacity frames of frame_size (width, height) that's allocated once, frames are written straight in to a slot and handed
+        around by slot number so nothing is copied or allocated per frame. With a multiprocessing context the frames live in shared memory and
+        the ring can be passed to other processes (as a Process argument), without one it's plain memory for threads.
+
+        Every slot has a generation number that goes up each time the slot is taken, a frame is handed around as (slot, generation).
+        Looking at or releasing a frame whose slot has since been reused raises ValueError instead of quietly reading the wrong frame.
+        '''
+        self.capacity = capacity
+        self.frame_size = frame_size
+        self.owner = True
+        if context is not None:
+            width, height = frame_size
+            self.memory = shared_memory.SharedMemory(create=True, size=capacity * (8 + height * width * 3))
+            self.free = context.Queue()
+        else:
+            self.memory = None
+            self.free = queue.Queue()
+        self.map()
+        self.generations[:] = 0
+        for slot in range(capacity):
+            self.free.put(slot)
+
+    def map(self) -> None:
+        '''Lays the generation numbers and the frames out over the memory'''
+        width, height = self.frame_size
+        if self.memory:
+            self.generations = np.ndarray((self.capacity,), dtype=np.int64, buffer=self.memory.buf)
+            self.frames = np.ndarray((self.capacity, height, width, 3), dtype=np.uint8, buffer=self.memory.buf, offset=self.capacity * 8)
+        else:
+            self.generations = np.zeros(self.capacity, dtype=np.int64)
+            self.frames = np.empty((self.capacity, height, width, 3), dtype=np.uint8)
+
+    def __getstate__(self) -> dict:
+        if not self.memory:
+            raise TypeError("Only a FrameRing made with a multiprocessing context can be sent to another process")
+        return {"capacity": self.capacity, "frame_size": self.frame_size, "name": self.memory.name, "free": self.free}
+
+    def __setstate__(self, state: dict) -> None:
+        '''Attaches to the ring's shared memory in another process'''
+        self.capacity = state["capacity"]
+        self.frame_size = state["frame_size"]
+        self.owner = False
+        self.memory = shared_memory.SharedMemory(name=state["name"])
+        self.free = state["free"]
+        self.map()
+
+    def acquire(self, timeout: float = None) -> (int, int):
+        '''Takes a free slot to write a frame in to and returns (slot, generation). Raises queue.Empty if timeout seconds pass without a free
+        slot and returns None once the ring is stopped'''
+        slot = self.free.get(timeout=timeout)
+        if slot is None:
+            self.free.put(None)
+            return None
+        self.generations[slot] += 1
+        return slot, int(self.generations[slot])
+
+    def view(self, slot: int, generation: int) -> np.ndarray:
+        '''The frame in slot, checking it hasn't been reused since it was handed out'''
+        if self.generations[slot] != generation:
+            raise ValueError(f"Frame slot {slot} was reused, generation {generation} is gone")
+        return self.frames[slot]
+
+    def release(self, slot: int, generation: int) -> None:
+        '''Gives a slot back to be reused. Releasing the same frame twice raises ValueError'''
+        if self.generations[slot] != generation:
+            raise ValueError(f"Frame slot {slot} generation {generation} was already released")
+        self.generations[slot] += 1
+        self.free.put(slot)
+
+    def stop(self) -> None:
+        '''Wakes up anything waiting on a free slot, acquire returns None from now on'''
+        self.free.put(None)
+
+    def close(self) -> None:
+        '''Detaches from the memory, the process that made the ring also frees it'''
+        self.generations = None
+        self.frames = None
+        if self.memory:
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
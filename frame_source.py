@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from frame_ring import FrameRing
+
+class FramePacket():
+    def __init__(self, index: int, timestamp: float, slot: int, frame: np.ndarray, generation: int = 0) -> None:
+        '''A decoded frame handed out by the FrameReader. index counts from 0, timestamp is the position in the video in milliseconds.
+        frame is a view of one of the ring's slots so it's only valid until the slot is released, generation is the slot's FrameRing generation'''
+        self.index = index
+        self.timestamp = timestamp
+        self.slot = slot
+        self.frame = frame
+        self.generation = generation
+
+class FrameReader():
+    def __init__(self, video_cap: cv2.VideoCapture, resize: (int, int) = None, capacity: int = 8, ring: FrameRing = None) -> None:
+        '''
+        Decodes (and optionally resizes) frames on a background thread in to a ring of capacity preallocated frames so decoding overlaps
+        with detection and tracking. The reader owns video_cap and releases it when closed.
+
+        Slots go around in a loop, the thread takes a free slot, decodes in to it and hands it to the tracker which gives it back once it's done.
+        When every slot is waiting on the tracker the thread blocks (back-pressure) so memory never grows past capacity frames.
+        The end of the video is signalled by next returning None.
+        The slots are a FrameRing, pass a shared one as ring to decode straight in to memory other processes can read, otherwise the
+        reader makes its own. busy is how many seconds the thread has spent decoding. When resizing, every frame is decoded in to the same
+        scratch frame at the video's own size and resized straight in to its slot, so nothing is allocated per frame.
+        '''
+        self.video_cap = video_cap
+        self.resize = resize
+        if resize:
+            width, height = resize
+        else:
+            width, height = int(video_cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.owns_ring = ring is None
+        self.ring = ring or FrameRing(capacity, (width, height))
+        self.frames = self.ring.frames
+        self.ready = queue.Queue()
+        self.busy = 0.0
+        self.scratch = None
+        self.held = None
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        index = 0
+        while not self.stopping.is_set():
+            try:
+                acquired = self.ring.acquire(timeout=0.1)
+            except queue.Empty:
+                continue
+            if acquired is None:
+                break
+            slot, generation = acquired
+            start = time.perf_counter()
+            timestamp = self.video_cap.get(cv2.CAP_PROP_POS_MSEC)
+            if self.resize:
+                ret, self.scratch = self.video_cap.read(self.scratch)
+                if ret:
+                    cv2.resize(self.scratch, self.resize, dst=self.frames[slot])
+            else:
+                ret, raw = self.video_cap.read(self.frames[slot])
+                if ret and raw is not None and raw.ctypes.data != self.frames[slot].ctypes.data:
+                    self.frames[slot] = raw
+            if not ret:
+                self.ring.release(slot, generation)
+                break
+            self.busy += time.perf_counter() - start
+            self.ready.put(FramePacket(index, timestamp, slot, self.frames[slot], generation))
+            index += 1
+        self.ready.put(None)
+
+    def next(self, timeout: float = None, hold: bool = False) -> FramePacket:
+        '''Returns the next decoded frame, or None at the end of the video. Raises queue.Empty if timeout seconds pass without a frame.
+        Normally the previous frame's slot is given back to the reader, so copy a frame if it has to outlive the next call.
+        With hold the slot is kept until release is called, which is how a batch of frames is held at once'''
+        if not hold:
+            self.release_held()
+        packet = self.ready.get(timeout=timeout)
+        if packet is None:
+            self.ready.put(None)
+            return None
+        if not hold:
+            self.held = packet
+        return packet
+
+    def release(self, packet: FramePacket) -> None:
+        '''Gives a held frame's slot back to the reader'''
+        self.ring.release(packet.slot, packet.generation)
+
+    def release_held(self) -> None:
+        if self.held is not None:
+            self.release(self.held)
+            self.held = None
+
+    def close(self) -> None:
+        '''Stops the decoding thread and releases the video'''
+        self.stopping.set()
+        self.release_held()
+        self.thread.join()
+        self.video_cap.release()
+        if self.owns_ring:
+            self.ring.close()
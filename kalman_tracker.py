@@ -0,0 +1,110 @@
+import numpy as np
+
+class KalmanTracker():
+    def __init__(self, dim: int = 2, capacity: int = 64, process_noise: float = 0.5, measurement_noise: float = 4.0,
+                 initial_variance: float = 10.0, max_speed: float = None) -> None:
+        '''Holds every live droplet's state in numpy arrays so predict and update run for all droplets in one batched step per frame.
+        The motion model is constant velocity, the state of a droplet is [position, velocity] where position and velocity are dim long
+        (dim = 2 for pixel x, y). Arrays are preallocated to capacity slots and doubled when they run out.
+
+        process_noise is how much we let the velocity wander every frame, measurement_noise is how noisy a detection midpoint is in pixels.
+        max_speed replaces speed_threshold, velocities are clamped to it so a bad detection can't launch a droplet off the course.
+        '''
+        self.dim = dim
+        self.size = 2 * dim
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.initial_variance = initial_variance
+        self.max_speed = max_speed
+
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.state = np.zeros((capacity, self.size))
+        self.covariance = np.zeros((capacity, self.size, self.size))
+        self.slot_of = {}
+
+        self.H = np.hstack((np.eye(dim), np.zeros((dim, dim))))
+        self.R = np.eye(dim) * measurement_noise
+
+    def __contains__(self, droplet_id) -> bool:
+        return droplet_id in self.slot_of
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def grow(self) -> None:
+        '''Doubles the number of slots'''
+        capacity = len(self.ids)
+        self.ids = np.concatenate((self.ids, np.full(capacity, -1, dtype=np.int64)))
+        self.state = np.concatenate((self.state, np.zeros((capacity, self.size))))
+        self.covariance = np.concatenate((self.covariance, np.zeros((capacity, self.size, self.size))))
+
+    def add(self, droplet_id, position, velocity) -> int:
+        '''Starts tracking a droplet at position moving with velocity. Returns the slot it was given'''
+        free = np.flatnonzero(self.ids == -1)
+        if not len(free):
+            self.grow()
+            free = np.flatnonzero(self.ids == -1)
+        slot = int(free[0])
+        self.ids[slot] = droplet_id
+        self.state[slot, :self.dim] = position
+        self.state[slot, self.dim:] = velocity
+        self.covariance[slot] = np.eye(self.size) * self.initial_variance
+        self.slot_of[droplet_id] = slot
+        return slot
+
+    def remove(self, droplet_id) -> None:
+        '''Stops tracking a droplet and frees its slot'''
+        slot = self.slot_of.pop(droplet_id)
+        self.ids[slot] = -1
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.ids != -1)
+
+    def transition(self, dt: float) -> (np.ndarray, np.ndarray):
+        '''Returns the constant velocity transition matrix F and process noise Q for a time step dt'''
+        F = np.eye(self.size)
+        F[:self.dim, self.dim:] = np.eye(self.dim) * dt
+        G = np.vstack((np.eye(self.dim) * (dt ** 2 / 2), np.eye(self.dim) * dt))
+        Q = G @ G.T * self.process_noise
+        return F, Q
+
+    def predict(self, dt: float = 1.0) -> None:
+        '''Advances every live droplet by dt frames in one batched step. x = Fx, P = FPF^T + Q'''
+        slots = self.active_slots()
+        if not len(slots):
+            return
+        F, Q = self.transition(dt)
+        self.state[slots] = self.state[slots] @ F.T
+        self.covariance[slots] = F @ self.covariance[slots] @ F.T + Q
+
+    def update(self, droplet_ids: list, measurements) -> None:
+        '''Corrects the droplets in droplet_ids with their measured positions (one row per droplet) in one batched step'''
+        if not len(droplet_ids):
+            return
+        slots = np.array([self.slot_of[droplet_id] for droplet_id in droplet_ids])
+        z = np.asarray(measurements, dtype=float).reshape(len(slots), self.dim)
+
+        x = self.state[slots]
+        P = self.covariance[slots]
+        innovation = z - x @ self.H.T
+        S = self.H @ P @ self.H.T + self.R
+        K = P @ self.H.T @ np.linalg.inv(S)
+        self.state[slots] = x + np.einsum('nij,nj->ni', K, innovation)
+        self.covariance[slots] = (np.eye(self.size) - K @ self.H) @ P
+
+        if self.max_speed is not None:
+            self.clamp_speed(slots)
+
+    def clamp_speed(self, slots: np.ndarray) -> None:
+        '''Scales down any velocity with a magnitude bigger than max_speed'''
+        velocity = self.state[slots, self.dim:]
+        speed = np.linalg.norm(velocity, axis=1)
+        too_fast = speed > self.max_speed
+        if too_fast.any():
+            velocity[too_fast] *= (self.max_speed / speed[too_fast])[:, None]
+            self.state[slots, self.dim:] = velocity
+
+    def positions(self) -> (np.ndarray, np.ndarray):
+        '''Returns the ids of every live droplet and an array of their positions in the same order'''
+        slots = self.active_slots()
+        return self.ids[slots], self.state[slots, :self.dim]
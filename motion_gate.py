@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+from course_lookup import CourseLookup, OFF_COURSE
+
+class MotionGate():
+    def __init__(self, course_lookup: CourseLookup, downsample: int = 4, pixel_threshold: int = 25, changed_fraction: float = 0.005,
+                 max_skips: int = 10) -> None:
+        '''
+        Cheap check run before YOLO that decides whether a frame is worth detecting on. The frame is turned grey, shrunk by downsample and
+        compared to the last frame detection ran on, only inside the course. A pixel changed if it's more than pixel_threshold different and a
+        segment changed if more than changed_fraction of its pixels did. When no segment changed the frame is skipped and the droplets'
+        predictions carry it. Comparing to the last detected frame instead of the previous frame means slow movement still adds up to a change.
+        max_skips is the most frames in a row that can be skipped before detection runs anyway, so the tracker is never blind for long.
+        '''
+        labels = course_lookup.label_image[::downsample, ::downsample]
+        self.size = (course_lookup.width, course_lookup.height)
+        self.small_size = (labels.shape[1], labels.shape[0])
+        self.cells = np.flatnonzero(labels != OFF_COURSE)
+        self.cell_segments = labels.ravel()[self.cells]
+        self.segment_cells = np.bincount(self.cell_segments, minlength=len(course_lookup.segments))
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skips = max_skips
+        self.previous = None
+        self.skips = 0
+        self.frames = 0
+        self.skipped = 0
+
+    def shrink(self, frame: np.ndarray) -> np.ndarray:
+        '''The grey, downsampled part of the frame the course covers'''
+        gray = cv2.cvtColor(frame[:self.size[1], :self.size[0]], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.small_size, interpolation=cv2.INTER_AREA)
+
+    def changed_segments(self, small: np.ndarray) -> np.ndarray:
+        '''Returns the indices of the segments that changed since the last detected frame'''
+        changed = cv2.absdiff(small, self.previous).ravel()[self.cells] > self.pixel_threshold
+        counts = np.bincount(self.cell_segments[changed], minlength=len(self.segment_cells))
+        return np.flatnonzero(counts > self.segment_cells * self.changed_fraction)
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        '''True if detection should run on this frame. Has to be called on every frame in order'''
+        self.frames += 1
+        small = self.shrink(frame)
+        if self.previous is None or self.skips >= self.max_skips or len(self.changed_segments(small)):
+            self.previous = small
+            self.skips = 0
+            return True
+        self.skips += 1
+        self.skipped += 1
+        return False
+
+    def skip_ratio(self) -> float:
+        '''Fraction of the frames so far that detection was skipped on'''
+        return self.skipped / self.frames if self.frames else 0.0
@@ -0,0 +1,178 @@
+import multiprocessing
+import queue
+import time
+import traceback
+import cv2
+from detection_stage import crop, to_frame_coordinates, load_backend
+from frame_ring import FrameRing
+from frame_source import FrameReader
+from onnx_backend import export_onnx
+
+class StageStats():
+    def __init__(self, context) -> None:
+        '''How long a stage's process spent working and on how many frames, kept in shared values so the main process can read them'''
+        self.busy = context.Value('d', 0.0, lock=False)
+        self.items = context.Value('q', 0, lock=False)
+
+    def record(self, start: float) -> None:
+        self.busy.value += time.perf_counter() - start
+        self.items.value += 1
+
+def run_stage(stage, errors, *args) -> None:
+    '''The target of every stage's process. Runs stage(*args) and if it fails sends the traceback back on errors before the process exits,
+    so the main process can raise it instead of waiting for frames that will never come'''
+    try:
+        stage(*args)
+    except BaseException:
+        errors.put(traceback.format_exc())
+        raise
+
+def decode_stage(video_path: str, resize: (int, int), ring: FrameRing, decoded, workers: int, stats: StageStats) -> None:
+    '''Decode process. A FrameReader decodes straight in to the shared ring and the (index, slot, generation) of every frame is passed on'''
+    reader = FrameReader(cv2.VideoCapture(video_path), resize, ring=ring)
+    while True:
+        packet = reader.next(hold=True)
+        if packet is None:
+            break
+        stats.busy.value = reader.busy
+        stats.items.value = packet.index + 1
+        decoded.put((packet.index, packet.slot, packet.generation))
+    for _ in range(workers):
+        decoded.put(None)
+    reader.close()
+    ring.close()
+
+def detect_stage(runtime: str, weights_path: str, threads: int, roi: (int, int, int, int), ring: FrameRing, decoded, detected,
+                 stats: StageStats) -> None:
+    '''Detection process. Loads its own model then detects on every frame it's given, frames can finish out of order between workers'''
+    backend = load_backend(runtime, weights_path, threads)
+    while True:
+        item = decoded.get()
+        if item is None:
+            break
+        index, slot, generation = item
+        start = time.perf_counter()
+        boxes = to_frame_coordinates(backend.detect([crop(ring.view(slot, generation), roi)])[0], roi)
+        stats.record(start)
+        detected.put((index, slot, generation, boxes))
+    detected.put(None)
+    ring.close()
+
+class Pipeline():
+    def __init__(self, video_path: str, weights_path: str, frame_size: (int, int), resize: (int, int) = None, runtime: str = "torch",
+                 threads: int = None, roi: (int, int, int, int) = None, workers: int = 1, capacity: int = 16,
+                 poll_interval: float = 1.0) -> None:
+        '''
+        Runs decoding and detection in their own processes so they overlap with tracking in the main process:
+            decode process -> detect process(es) -> tracker (main process) -> render thread
+        Stages are connected by bounded queues and frames live in a shared FrameRing, only slot numbers and detections go through the queues.
+        capacity is how many frames can be in flight at once, when they're all taken the decoder waits (back-pressure).
+        With more than one detect worker frames can come back out of order, frames puts them back in order so the tracker sees
+        every frame in sequence. frame_size is the (width, height) of the frames after resize.
+        While waiting for detections the processes are checked every poll_interval seconds, a stage that died raises in frames.
+        The onnx runtime exports the weights here, once, before any worker starts so the workers don't all export on to the same file.
+        '''
+        if runtime == "onnx":
+            weights_path = export_onnx(weights_path)
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.errors = context.Queue()
+        self.ring = FrameRing(capacity, frame_size, context)
+        self.decoded = context.Queue(capacity)
+        self.detected = context.Queue(capacity)
+        self.queues = {"decode -> detect": self.decoded, "detect -> track": self.detected}
+        self.depths = {}
+        self.stats = {"decode": [StageStats(context)], "detect": [StageStats(context) for _ in range(workers)]}
+        self.track_busy = 0.0
+        self.track_items = 0
+
+        self.processes = [context.Process(target=run_stage, daemon=True, name="decode",
+                                          args=(decode_stage, self.errors, video_path, resize, self.ring, self.decoded, workers,
+                                                self.stats["decode"][0]))]
+        for worker, stats in enumerate(self.stats["detect"]):
+            self.processes.append(context.Process(target=run_stage, daemon=True, name=f"detect-{worker}",
+                                                  args=(detect_stage, self.errors, runtime, weights_path, threads, roi, self.ring,
+                                                        self.decoded, self.detected, stats)))
+        self.start_time = time.perf_counter()
+        for process in self.processes:
+            process.start()
+
+    def sample_depths(self) -> None:
+        '''Records how many items are waiting in every queue. Queue sizes aren't available on macOS, those queues are left out'''
+        for name, waiting in list(self.queues.items()):
+            try:
+                depth = waiting.qsize()
+            except NotImplementedError:
+                del self.queues[name]
+                continue
+            total, samples, deepest = self.depths.get(name, (0, 0, 0))
+            self.depths[name] = (total + depth, samples + 1, max(deepest, depth))
+
+    def frames(self, recorder=None):
+        '''Yields (frame, boxes) for every frame in order, the same as detection_frames. frame is a view of the shared ring that's reused once
+        the next frame is asked for. Detections are added to the recorder if there is one'''
+        pending = {}
+        finished = 0
+        expected = 0
+        while True:
+            if expected in pending:
+                index, slot, generation, boxes = pending.pop(expected)
+            elif finished == self.workers:
+                return
+            else:
+                try:
+                    item = self.detected.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    self.check_processes()
+                    continue
+                if item is None:
+                    finished += 1
+                else:
+                    pending[item[0]] = item
+                continue
+
+            self.sample_depths()
+            if recorder:
+                recorder.add(boxes)
+            start = time.perf_counter()
+            yield self.ring.view(slot, generation), boxes
+            self.track_busy += time.perf_counter() - start
+            self.track_items += 1
+            self.ring.release(slot, generation)
+            expected += 1
+
+    def check_processes(self) -> None:
+        '''Raises RuntimeError with the stage's traceback if any stage's process died, after stopping the others'''
+        failed = [process for process in self.processes if not process.is_alive() and process.exitcode != 0]
+        if not failed:
+            return
+        try:
+            error = self.errors.get(timeout=self.poll_interval)
+        except queue.Empty:
+            error = "no traceback was sent back"
+        self.close()
+        raise RuntimeError(f"Pipeline stage {failed[0].name} exited with code {failed[0].exitcode}:\n{error}")
+
+    def report(self) -> None:
+        '''Prints how busy every stage was and how full the queues between them were. The stage that's always busy with an empty queue
+        in front of the next stage is the bottleneck'''
+        elapsed = time.perf_counter() - self.start_time
+        print(f"{'stage':<10}{'frames':>8}{'busy s':>10}{'utilization':>13}")
+        stages = [(name, sum(stats.items.value for stats in group), sum(stats.busy.value for stats in group), len(group))
+                  for name, group in self.stats.items()]
+        stages.append(("track", self.track_items, self.track_busy, 1))
+        for name, items, busy, processes in stages:
+            print(f"{name:<10}{items:>8}{busy:>10.2f}{busy / (elapsed * processes):>13.1%}")
+        print(f"{'queue':<20}{'mean depth':>12}{'max depth':>11}")
+        for name, (total, samples, deepest) in self.depths.items():
+            print(f"{name:<20}{total / samples:>12.1f}{deepest:>11}")
+
+    def close(self) -> None:
+        '''Stops the workers, if the video didn't finish they're stopped where they are'''
+        self.ring.stop()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+class Span():
+    def __init__(self, profiler, name: str) -> None:
+        '''Times the code inside a with block as one stage'''
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+class NoSpan():
+    '''What stage hands out when the profiler is off, entering and leaving it does nothing'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+NO_SPAN = NoSpan()
+
+class Profiler():
+    def __init__(self, enabled: bool = False, frame_budget: float = None, trace: bool = False) -> None:
+        '''
+        Times every stage of the tracker so the report shows which one is the bottleneck. The frame loop is timed with laps, start_frame at
+        the top of the loop then lap(name) after each stage records the time since the last lap, so nothing has to be re-indented into with
+        blocks. Code outside the loop (decoding and detection in the generators) uses with profiler.stage(name) instead.
+        frame_budget is how many milliseconds a frame can take (1000 / fps to keep up with the video), frames over it are counted.
+        trace keeps every span so write_trace can save a Chrome trace to look at in chrome://tracing or Perfetto.
+        When it's not enabled every call returns straight away so it costs next to nothing to leave in.
+        '''
+        self.enabled = enabled
+        self.frame_budget = frame_budget / 1000 if frame_budget else None
+        self.trace = trace
+        self.durations = {}
+        self.events = []
+        self.overruns = 0
+        self.frame_start = None
+        self.mark = None
+        self.start_time = time.perf_counter()
+
+    def record(self, name: str, start: float, end: float) -> None:
+        self.durations.setdefault(name, []).append(end - start)
+        if self.trace:
+            self.events.append((name, start, end, threading.get_ident()))
+
+    def stage(self, name: str):
+        '''Context manager that times its block as the stage name'''
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    def start_frame(self) -> None:
+        '''Called at the top of the frame loop. Ends the previous frame, whose time is everything since its start_frame including waiting
+        for this frame to be decoded and detected'''
+        if not self.enabled:
+            return
+        self.end_frame()
+        self.frame_start = self.mark = time.perf_counter()
+
+    def end_frame(self) -> None:
+        '''Records the frame that's running and checks it against the budget. Called after the frame loop for the last frame'''
+        if not self.enabled or self.frame_start is None:
+            return
+        now = time.perf_counter()
+        self.record("frame", self.frame_start, now)
+        if self.frame_budget and now - self.frame_start > self.frame_budget:
+            self.overruns += 1
+        self.frame_start = None
+
+    def lap(self, name: str) -> None:
+        '''Records the time since the last lap (or start_frame) as the stage name'''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.record(name, self.mark, now)
+        self.mark = now
+
+    def summary(self) -> dict:
+        '''Every stage's count, mean, p50, p95, p99 and max in milliseconds and its share of the total frame time, as plain numbers to save to JSON'''
+        frame_total = sum(self.durations.get("frame", [])) or 1
+        stages = {}
+        for name, durations in self.durations.items():
+            milliseconds = np.array(durations) * 1000
+            p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+            stages[name] = {"count": len(durations), "mean": float(milliseconds.mean()), "p50": float(p50), "p95": float(p95),
+                            "p99": float(p99), "max": float(milliseconds.max()), "share": sum(durations) / frame_total}
+        return stages
+
+    def report(self) -> None:
+        '''Prints how long every stage took, its percentiles in milliseconds and how many frames went over the budget'''
+        if not self.enabled:
+            return
+        print(f"{'stage':<12}{'count':>8}{'mean ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'of frame':>10}")
+        for name, stage in self.summary().items():
+            print(f"{name:<12}{stage['count']:>8}{stage['mean']:>10.2f}{stage['p50']:>9.2f}{stage['p95']:>9.2f}{stage['p99']:>9.2f}{stage['max']:>9.2f}{stage['share']:>10.1%}")
+        frames = len(self.durations.get("frame", []))
+        if self.frame_budget and frames:
+            print(f"{self.overruns} of {frames} frames ({self.overruns / frames:.1%}) went over the {self.frame_budget * 1000:.1f} ms budget")
+
+    def write_trace(self, path: str) -> None:
+        '''Saves every span in the Chrome trace event format, one complete event per span with times in microseconds'''
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self.start_time) * 1e6, "dur": (end - start) * 1e6, "pid": pid, "tid": tid}
+                  for name, start, end, tid in self.events]
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+DISABLED = Profiler()
@@ -0,0 +1,28 @@
+import numpy as np
+from droplet_spawner import DispenserSpawner
+
+DISPENSERS = [((445, 55), (455, 65))]
+
+def make_droplet(droplet_id, x, y, trajectory, section):
+    return (droplet_id, x, y)
+
+def test_slow_droplet_is_spawned_once():
+    '''A droplet creeps out of the dispenser at a quarter pixel a frame, taking 20 frames to leave the box, and its detection is never
+    matched. It's the same droplet the whole way so only one should start'''
+    spawner = DispenserSpawner(DISPENSERS, make_droplet, cooldown=5, max_jump=40)
+    live = np.zeros((0, 2))
+    spawned = []
+    for t in range(1, 200):
+        mid = (450 - .25 * t, 60)
+        drops = spawner.spawn_from(t, [mid], np.zeros(1, dtype=np.int64), [0], live)
+        spawned += drops
+        if drops or len(live):
+            live = np.array([mid])
+    assert len(spawned) == 1
+
+def test_next_droplet_spawns_once_the_last_is_gone():
+    '''Once the live droplet is out of the box and further than max_jump away a new detection in the dispenser starts a droplet'''
+    spawner = DispenserSpawner(DISPENSERS, make_droplet, cooldown=5, max_jump=40)
+    assert len(spawner.spawn_from(1, [(450, 60)], np.zeros(1, dtype=np.int64), [0])) == 1
+    assert spawner.spawn_from(30, [(450, 60)], np.zeros(1, dtype=np.int64), [0], np.array([(445, 60)])) == []
+    assert spawner.spawn_from(60, [(450, 60)], np.zeros(1, dtype=np.int64), [0], np.array([(380, 60)])) == [(2, 450, 60)]
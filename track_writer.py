@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+from droplet_lifecycle import STATE_NAMES
+
+FIELDS = ("frame", "timestamp", "id", "x", "y", "segment", "observed", "confidence", "state")
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+
+class TrackWriter():
+    def __init__(self, path: str, file_format: str = None, buffer_rows: int = 4096) -> None:
+        '''
+        Writes where every droplet is on every frame, one row per droplet per frame with the FIELDS columns. observed is whether a detection
+        was matched to the droplet this frame (otherwise x, y is the prediction) and confidence is that detection's confidence. state is the
+        droplet's lifecycle state (see DropletLifecycle), the last row of a droplet that left the course says exited or lost.
+        file_format is "csv", "ndjson" (one JSON object per line, good for tailing while the tracker runs) or "parquet" (columnar, for analysis,
+        needs pyarrow), without one it's picked from the file extension. Rows are buffered and written buffer_rows at a time so the tracker
+        isn't writing to disk on every frame.
+        '''
+        self.path = path
+        self.file_format = file_format or FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+        self.buffer_rows = buffer_rows
+        self.rows = []
+        if self.file_format == "parquet":
+            import pyarrow
+            import pyarrow.parquet
+            self.pyarrow = pyarrow
+            self.schema = pyarrow.schema([("frame", pyarrow.int32()), ("timestamp", pyarrow.float64()), ("id", pyarrow.int32()),
+                                          ("x", pyarrow.float32()), ("y", pyarrow.float32()), ("segment", pyarrow.int16()),
+                                          ("observed", pyarrow.bool_()), ("confidence", pyarrow.float32()), ("state", pyarrow.string())])
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.file = open(path, 'w', newline='')
+            if self.file_format == "csv":
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(FIELDS)
+
+    def write_frame(self, t: int, drops, timestamp: float = None, confidences: dict = None) -> None:
+        '''Adds a row for every droplet in drops at frame t. timestamp is the frame's time in milliseconds and confidences maps the id of every
+        droplet that was observed this frame to the confidence of its detection'''
+        confidences = confidences or {}
+        for drop in drops:
+            confidence = confidences.get(drop.id)
+            self.rows.append((t, timestamp, drop.id, round(drop.x, 2), round(drop.y, 2), drop.current_section, confidence is not None, confidence,
+                              STATE_NAMES[drop.state]))
+        if len(self.rows) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes every buffered row in one go'''
+        if not self.rows:
+            return
+        if self.file_format == "parquet":
+            columns = list(zip(*self.rows))
+            self.writer.write_table(self.pyarrow.table({field: list(column) for field, column in zip(FIELDS, columns)}, schema=self.schema))
+        elif self.file_format == "ndjson":
+            self.file.write("".join(json.dumps(dict(zip(FIELDS, row))) + "\n" for row in self.rows))
+            self.file.flush()
+        else:
+            self.writer.writerows(self.rows)
+        self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.file_format == "parquet":
+            self.writer.close()
+        else:
+            self.file.close()
+
+def read_tracks(path: str, file_format: str = None) -> dict:
+    '''Reads a file written by TrackWriter, or a ground truth file with at least the frame, id, x and y columns in any of the same formats.
+    Returns {frame: [(id, x, y), ...]}'''
+    file_format = file_format or FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+    if file_format == "parquet":
+        import pyarrow.parquet
+        rows = pyarrow.parquet.read_table(path, columns=["frame", "id", "x", "y"]).to_pylist()
+    else:
+        with open(path, 'r', newline='') as file:
+            if file_format == "ndjson":
+                rows = [json.loads(line) for line in file if line.strip()]
+            else:
+                rows = list(csv.DictReader(file))
+    frames = {}
+    for row in rows:
+        frames.setdefault(int(row["frame"]), []).append((int(row["id"]), float(row["x"]), float(row["y"])))
+    return frames
@@ -0,0 +1,39 @@
+import queue
+import threading
+import cv2
+
+class AsyncVideoWriter():
+    def __init__(self, path: str, fps: float, max_pending: int = 8, fourcc: str = "mp4v") -> None:
+        '''
+        Writes annotated frames to a video file on a background thread so encoding never holds up the tracker.
+        At most max_pending frames wait to be written, once that many are waiting write blocks until the thread catches up.
+        The cv2.VideoWriter is opened on the first frame so the frame size doesn't have to be known ahead of time.
+        '''
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, frame) -> None:
+        '''Queues a frame to be written. The frame must not be drawn on again after it's queued'''
+        self.queue.put(frame)
+
+    def run(self) -> None:
+        writer = None
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(self.path, self.fourcc, self.fps, (width, height))
+            writer.write(frame)
+        if writer is not None:
+            writer.release()
+
+    def close(self) -> None:
+        '''Waits for every queued frame to be written and closes the file'''
+        self.queue.put(None)
+        self.thread.join()